@@ -4,23 +4,30 @@ import time
 import logging
 # Add the directory where Motors is located to the system path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from pytrinamic.connections import ConnectionManager
 from Motors.trinamic_controller import TMCM3212
+from Motors.fly_scan import fly_scan
+from Motors.log_config import log_limited
+from Motors.metrics import timed
+from Motors.units import delay_units
 #from pytrinamic.features import LinearRamp, StallGuard2Module, CoolStepModule
 
 
-# Setup logging configuration to write to delaylinelog.txt
-logging.basicConfig(filename="delaylinelog.txt", 
-                    level=logging.INFO, 
-                    format="%(asctime)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Poll loops log at most once per this many seconds per call site
+POLL_LOG_INTERVAL = 1.0
 
 class DelayLine(TMCM3212):
-    def __init__(self, connection, module_id=1, ap_index_bitwidth=8, step_angle=1.8, lead_pitch=5.08):
-        super().__init__(connection, module_id, ap_index_bitwidth)
-        self.connection = connection
-        self.ap_index_bit_width = ap_index_bitwidth
-        self.module_id = module_id
-        self.module = TMCM3212(self.connection)
+    # Fast homing searches slowly only over the last FAST_HOME_WINDOW microsteps
+    # before the known switch position
+    FAST_HOME_WINDOW = 2000
+    FAST_HOME_SEARCH_SPEED = 2000
+
+    def __init__(self, connection, module_id=1, ap_index_bitwidth=8, step_angle=1.8, lead_pitch=5.08,
+                 profile="delay_line", store_profile=False, time_zero_mm=0.0, ramp_planner=None,
+                 verify_profile=True):
+        # One TMCM3212 per connection and module, shared with the other axis wrappers
+        self._use_shared(connection, module_id, ap_index_bitwidth)
         self.motor = self.module.motors[0]
 
         # Calculate the steps in each revolution
@@ -34,83 +41,151 @@ class DelayLine(TMCM3212):
         # Set home position of the delay line
         self.home_position = 1
 
-        # Set motor parameters
-        logging.info('Setting motor parameters')
-        self.motor.drive_settings.max_current = 8  # Set to 0.40A
-        self.motor.drive_settings.standby_current = 0  # Typically half of max current
-        self.motor.drive_settings.boost_current = 0  # Set if additional current is needed
-        self.motor.drive_settings.microstep_resolution = self.motor.ENUM.microstep_resolution_256_microsteps
-        logging.info(f'Drive Settings: {self.motor.drive_settings}')
-
-        self.motor.set_axis_parameter(self.motor.AP.RunCurrent, 8)
-        logging.info(f'Run current: {self.motor.get_axis_parameter(self.motor.AP.RunCurrent)}')
-
-        # Set initial motor position
-        self.motor.actual_position = 0
+        # Step conversions in mm of travel and in ps of optical delay from time zero
+        self.mm = delay_units(self, "mm")
+        self.ps = delay_units(self, "ps", time_zero_mm)
 
-        # Set velocity and acceleration
-        self.motor.set_axis_parameter(self.motor.AP.MaxAcceleration, 30000)
-        self.motor.set_axis_parameter(self.motor.AP.MaxVelocity, 30000)
-        logging.info(f'Linear Ramp: {self.motor.linear_ramp}')
+        # Bring the axis to its configuration profile, writing only what differs.
+        # Without verify_profile a matching stored profile hash skips the readback
+        logger.info('Applying motor profile')
+        result = self.module.apply_profile(0, profile, store=store_profile, verify=verify_profile)
+        logger.info('Profile applied: %s', result)
 
-        logging.info(f'StallGuard2: {self.motor.stallguard2}')
-        logging.info(f'Load Value: {self.motor.get_axis_parameter(self.motor.AP.LoadValue)}')
+        # Optional RampPlanner choosing the ramp of moves without an explicit velocity
+        self.ramp_planner = ramp_planner
 
-        # Set the freewheeling mode
-        self.motor.set_axis_parameter(self.motor.AP.FreewheelingMode, value=3)
+        # Duration and switch deviation of every homing run, see go_to_home_position
+        self.homing_history = []
 
-        # Set PWM parameters
-        self.motor.set_axis_parameter(self.motor.AP.PWMGrad, value=1)
-        self.motor.set_axis_parameter(self.motor.AP.PWMAmplitude, value=64)
-        self.motor.set_axis_parameter(self.motor.AP.PWMAutoscale, value=1)
-        self.motor.set_axis_parameter(self.motor.AP.PWMThresholdSpeed, value=51200)
-        logging.info(f'PWM Mode: {self.motor.get_axis_parameter(self.motor.AP.PWMMode)}')
-        logging.info(f'PWM Frequency: {self.motor.get_axis_parameter(self.motor.AP.PWMFrequency)}')
-        logging.info(f'PWM Threshold Speed: {self.motor.get_axis_parameter(self.motor.AP.PWMThresholdSpeed)}')
+        # Set initial motor position, unless the module still holds the homed reference
+        if not self.module.is_referenced(0):
+            self.motor.actual_position = 0
 
     def rotate(self, axis, velocity):
-        logging.info(f'Rotating axis {axis} with velocity {velocity}')
+        logger.info('Rotating axis %s with velocity %s', axis, velocity)
         self.connection.rotate(axis, velocity, self.module_id)
 
-    def move_to(self, axis, position, velocity=None):
-        steps = int((position * self.steps_rev) / self.lead_pitch)
-        if steps < self.min_position:
-            steps = self.min_position
-            logging.warning("Minimum position reached, can't move any further.")
-        elif steps > self.max_position:
-            steps = self.max_position
-            logging.warning("Maximum position reached, can't move any further.")
+    @timed("delay_line.move_to")
+    def move_to(self, axis, position, velocity=None, unit="mm", wait=False, timeout=None):
+        """
+        Move to `position` in `unit`. Returns {"written", "predicted", "measured"}
+        as TMCM3212.move_planned does: the time is predicted only when the ramp
+        planner chooses the ramp, and measured only with `wait`.
+        """
+        target = (self.ps if unit == "ps" else self.mm).to_steps(position)
+        steps = int(target.steps)
+        if target.clamped and steps == self.min_position:
+            logger.warning("Minimum position reached, can't move any further.")
+        elif target.clamped:
+            logger.warning("Maximum position reached, can't move any further.")
     
+        written = {}
         if velocity:
-            self.motors[axis].linear_ramp.max_velocity = velocity
-        logging.info(f'Moving to position {position} with steps {steps}')
-        self.connection.move_to(axis, steps, self.module_id)
+            written = self.module.write_changed(axis, {self.motor.AP.MaxVelocity: int(velocity)})
+        elif self.ramp_planner is not None:
+            result = self.module.move_planned(axis, steps, self.ramp_planner, wait, timeout)
+            logger.info('Moving to position %s %s with steps %s, predicted %.3f s', position, unit, steps,
+                        result["predicted"])
+            return result
+        logger.info('Moving to position %s %s with steps %s', position, unit, steps)
+        return self.module.timed_move(axis, steps, written, wait=wait, timeout=timeout)
 
     def move_by(self, axis, difference, velocity=None):
         target_position = self.get_position() + difference
         if velocity:
             self.motor.linear_ramp.max_velocity = velocity
-        logging.info(f'Moving by difference {difference}, target position {target_position}')
+        logger.info('Moving by difference %s, target position %s', difference, target_position)
         self.move_to(axis, target_position, self.module_id)
 
     def stop(self, axis):
-        logging.info(f'Stopping axis {axis}')
+        logger.info('Stopping axis %s', axis)
         self.connection.stop(axis, self.module_id)
     
     def get_position(self):
         position = self.motor.get_axis_parameter(self.motor.AP.ActualPosition)
-        logging.info(f'Current motor position: {position}')
+        log_limited(logger, logging.INFO, POLL_LOG_INTERVAL, 'Current motor position: %s', position)
         return position
        
     def is_position_reached(self):
         position_reached = self.motor.get_axis_parameter(self.motor.AP.PositionReachedFlag)
-        logging.info(f'Position reached flag: {position_reached}')
+        log_limited(logger, logging.INFO, POLL_LOG_INTERVAL, 'Position reached flag: %s', position_reached)
         return position_reached
     
-    def go_to_home_position(self):
+    def wait_until_reached(self, timeout=10):
+        reached = self.module.wait_until_reached(0, timeout)
+        logger.info('Position reached: %s', reached)
+        return reached
+
+    def fly_scan(self, start, stop, velocity, encoder=False, timeout=60):
+        """Sweep from `start` to `stop` mm at constant `velocity`, returning a position(timestamp) interpolator."""
+        logger.info('Fly scan from %s mm to %s mm at velocity %s', start, stop, velocity)
+        result = fly_scan(self, start, stop, velocity, encoder, timeout)
+        logger.info('Fly scan recorded %d samples at %.1f Hz', len(result), result.sample_rate)
+        return result
+
+    @timed("delay_line.go_to_home_position")
+    def go_to_home_position(self, fast=True):
+        """
+        Home the delay line on its home switch and zero the position there.
+
+        With `fast`, and if the module still holds the reference of an earlier
+        homing, the stage moves at full speed to FAST_HOME_WINDOW steps before
+        the switch and only searches the last stretch slowly. If the switch is
+        not found there, the full reference search runs instead.
+        """
+        start_time = time.monotonic()
+        if fast and self.module.is_referenced(0):
+            logger.info('Starting fast homing procedure')
+            deviation = self._fast_home()
+            if deviation is not None:
+                self._record_homing("fast", start_time, deviation)
+                return
+            logger.warning('Home switch not found where expected, running the full reference search')
+            self.module.set_referenced(0, False)
+        self._full_home()
+        if self.module.is_referenced(0):
+            self._record_homing("full", start_time, None)
+
+    def homing_repeatability(self):
+        """Spread in microsteps of the switch positions found by fast homing, None before two runs."""
+        deviations = [run["deviation"] for run in self.homing_history if run["deviation"] is not None]
+        return max(deviations) - min(deviations) if len(deviations) > 1 else None
+
+    def _record_homing(self, method, start_time, deviation):
+        run = {"method": method, "seconds": time.monotonic() - start_time, "deviation": deviation}
+        self.homing_history.append(run)
+        logger.info('Homing (%s) took %.3f s, switch deviation %s steps', method, run["seconds"], deviation)
+
+    def _fast_home(self, timeout=10):
+        """Two-phase homing, returns how far from the expected position the switch was found, or None."""
+        ap = self.motor.AP
+        window = self.FAST_HOME_WINDOW
+        time_scale = getattr(self.connection, "time_scale", 1.0)
+
+        # Mode 7 searches towards positive positions, so stop short of the switch at 0
+        self.connection.move_to(0, -window, self.module_id)
+        if not self.module.wait_until_reached(0, timeout):
+            return None
+        if self.motor.get_axis_parameter(ap.HomeSwitch) == 0:
+            # Already on the switch before the window
+            return None
+
+        self.module.write_many(0, {ap.ReferenceSearchMode: 7, ap.ReferenceSearchSpeed: self.FAST_HOME_SEARCH_SPEED,
+                                   ap.RefSwitchSpeed: 500})
+        self.start_reference_search(motor=0)
+        # Twice the time to cross the window at search speed, with room for the final creep
+        deadline = time.monotonic() + (2 * window / self.FAST_HOME_SEARCH_SPEED + 1.0) / time_scale
+        while self.get_reference_search_status(motor=0):
+            if time.monotonic() > deadline:
+                self.stop_reference_search(motor=0)
+                return None
+            time.sleep(0.01)
+        return self.module.get_axis_parameter(ap.LastReferencePosition, 0, signed=True)
+
+    def _full_home(self):
         time_out = 10
         start_time = time.time()
-        logging.info('Starting homing procedure')
+        logger.info('Starting homing procedure')
 
         # Set reference speed
         self.motor.set_axis_parameter(self.motor.AP.ReferenceSearchMode, 7)
@@ -118,40 +193,45 @@ class DelayLine(TMCM3212):
         self.motor.set_axis_parameter(self.motor.AP.RefSwitchSpeed, 500)
 
         home_state = self.motor.get_axis_parameter(self.motor.AP.HomeSwitch)
-        logging.info(f'Initial home state: {home_state}')
+        logger.info('Initial home state: %s', home_state)
 
         try:
             initial_status = self.get_reference_search_status(motor=0)
-            logging.info(f'Reference search status initially: {initial_status}')
+            logger.info('Reference search status initially: %s', initial_status)
             
             # Start reference search
             self.start_reference_search(motor=0, mode=7)
-            logging.info('Starting reference search')
+            logger.info('Starting reference search')
 
             while True:
                 current_home_state = self.motor.get_axis_parameter(self.motor.AP.HomeSwitch)
-                logging.info(f'Current home state: {current_home_state}')
+                log_limited(logger, logging.INFO, POLL_LOG_INTERVAL, 'Current home state: %s', current_home_state)
 
                 # Check if home state is 0 (meaning home is reached)
                 if current_home_state == 0:
-                    logging.info('Home position reached')
+                    logger.info('Home position reached')
+                    # Let the search latch the switch edge before zeroing there
+                    while self.get_reference_search_status(motor=0) and time.time() - start_time <= time_out:
+                        time.sleep(0.01)
                     self.motor.set_axis_parameter(self.motor.AP.ActualPosition, 0)
-                    logging.info('Motor actual position set to 0')
+                    self.module.set_referenced(0)
+                    logger.info('Motor actual position set to 0')
                     break
 
                 if time.time() - start_time > time_out:
-                    logging.warning('Homing procedure timed out')
+                    logger.warning('Homing procedure timed out')
                     self.stop(0)
+                    self.module.set_referenced(0, False)
                     break
 
                 time.sleep(0.2)
 
-            logging.info('Homing procedure completed')
+            logger.info('Homing procedure completed')
 
         except Exception as e:
-            logging.error(f"An error occurred during homing: {e}")
+            logger.error("An error occurred during homing: %s", e)
             try:
                 self.stop_reference_search(motor=0)  # Stop reference search if an error occurs
-                logging.info("Stopped reference search.")
+                logger.info("Stopped reference search.")
             except Exception as stop_error:
-                logging.error(f"Failed to stop the motor gracefully: {stop_error}")
+                logger.error("Failed to stop the motor gracefully: %s", stop_error)
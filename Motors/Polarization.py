@@ -1,17 +1,17 @@
-from pytrinamic.features.linear_ramp import LinearRamp
-from pytrinamic.features.drive_setting import DriveSetting 
 from Motors.trinamic_controller import TMCM3212 
+from Motors.metrics import timed
+from Motors.units import angle_units
+import logging
 import time
-from pytrinamic.tmcl import TMCLCommand
+
+logger = logging.getLogger(__name__)
 
 class PolarizationPaddler(TMCM3212):
 
-    def __init__(self,connection,module_id=1,ap_index_bit_width=8,step_angle=0.9):
-        super().__init__(connection,module_id,ap_index_bit_width)
-        self.connection=connection
-        self.ap_index_bit_width=ap_index_bit_width
-        self.module_id=module_id
-        self.module=TMCM3212(self.connection)
+    def __init__(self,connection,module_id=1,ap_index_bit_width=8,step_angle=0.9,
+                 profile="polarization_paddler",store_profile=False,ramp_planner=None,verify_profile=True):
+        #One TMCM3212 per connection and module, shared with the other axis wrappers
+        self._use_shared(connection,module_id,ap_index_bit_width)
         self.motor=self.module.motors[1]
 
         #Calculate the steps in each revolution
@@ -21,36 +21,39 @@ class PolarizationPaddler(TMCM3212):
         self.min_position=(-180*self.steps_rev)/360
         self.max_position=(180*self.steps_rev)/360
 
-        # Set motor parameters
-        print('Setting motor parameters')
-        self.motor.drive_settings.max_current=40 # Set to 0.40A
-        self.motor.drive_settings.standby_current=0  # Typically half of max current
-        self.motor.drive_settings.boost_current=0  # Set if additional current is needed
-        self.motor.drive_settings.microstep_resolution = self.motor.ENUM.microstep_resolution_256_microsteps
-        print(self.motor.drive_settings)
+        #Step conversion in degrees
+        self.degrees=angle_units(self)
+
+        # Bring the axis to its configuration profile, writing only what differs.
+        # Without verify_profile a matching stored profile hash skips the readback
+        logger.info('Applying motor profile')
+        logger.info('Profile applied: %s', self.module.apply_profile(1, profile, store=store_profile,
+                                                                      verify=verify_profile))
+
+        #Optional RampPlanner choosing the ramp of moves without an explicit velocity
+        self.ramp_planner=ramp_planner
 
         self.motor.actual_position=0
-        
-        #Setting the velocity and acceleration of the axis
-        self.motor.set_axis_parameter(self.motor.AP.MaxAcceleration,30000)
-        self.motor.set_axis_parameter(self.motor.AP.MaxVelocity,30000)
-        print(self.motor.linear_ramp)
 
     def rotate(self, axis,velocity):
         self.connection.rotate(axis, velocity, self.module_id)
 
-    def move_to(self, axis, position, velocity=None):
-        steps=int((position*self.steps_rev)/360)
-        if steps < self.min_position:
-            steps = self.min_position
-            print("Minimum position reached, can't move any further.")
-        elif steps > self.max_position:
-            steps = self.max_position
-            print("Maximum position reached, can't move any further.")
+    @timed("polarization.move_to")
+    def move_to(self, axis, position, velocity=None, wait=False, timeout=None):
+        """Move to `position` in degrees, returning the same result as DelayLine.move_to."""
+        target=self.degrees.to_steps(position)
+        steps=int(target.steps)
+        if target.clamped and steps == self.degrees.min_steps:
+            logger.warning("Minimum position reached, can't move any further.")
+        elif target.clamped:
+            logger.warning("Maximum position reached, can't move any further.")
     
+        written={}
         if velocity:
-            self.motors[axis].linear_ramp.max_velocity = velocity
-        self.connection.move_to(axis, steps, self.module_id)
+            written=self.module.write_changed(axis, {self.motor.AP.MaxVelocity: int(velocity)})
+        elif self.ramp_planner is not None:
+            return self.module.move_planned(axis, steps, self.ramp_planner, wait, timeout)
+        return self.module.timed_move(axis, steps, written, wait=wait, timeout=timeout)
 
     def move_by(self, axis, difference, velocity=None):
         target_position = self.get_position() + difference
@@ -67,70 +70,17 @@ class PolarizationPaddler(TMCM3212):
     def is_position_reached(self):
         return self.motor.get_axis_parameter(self.motor.AP.PositionReachedFlag)
     
+    def wait_until_reached(self, timeout=10):
+        return self.module.wait_until_reached(1, timeout)
+
     def is_home_position(self,home_status):
         return self.motor.get_axis_parameter(self.motor.AP.HomeSwitch)
     
-    # def go_to_home_position(self):
-    #     time_out=10
-    #     start_time=time.time()
-    #     print('Starting homing procedure')
-    #     # Set reference speedspeed
-    #     self.motor.set_axis_parameter(self.motor.AP.ReferenceSearchSpeed, 1000)
-    #     self.motor.set_axis_parameter(self.motor.AP.RefSwitchSpeed, 500)
-
-    #     # Check home sensor state
-    #     #self.motor.set_axis_parameter(self.motor.AP.HomeSwitch, value=0)
-    #     initial_home_sensor_state = self.motor.get_axis_parameter(self.motor.AP.HomeSwitch)
-    #     print(f"Home sensor state: {initial_home_sensor_state}")
-
-    #     # if initial_home_sensor_state:
-    #     #     print("Already at home position, moving away slightly...")
-    #     #     self.motor.move_by(-1000)  # Move by a small amount away from the home position
-    #     #     time.sleep(2)  # Wait for the move to complete
-    #     #     initial_home_sensor_state = self.motor.get_axis_parameter(self.motor.AP.HomeSwitch)
-    #     #     print(f"Home sensor state after moving away: {initial_home_sensor_state}")
-
-    #     # Set reference search mode based on sensor state
-    #     if initial_home_sensor_state==0:
-    #         self.motor.set_axis_parameter(self.motor.AP.ReferenceSearchMode, 8)
-    #     else:
-    #         self.motor.set_axis_parameter(self.motor.AP.ReferenceSearchMode, 132)
-
-    #     # Start reference search
-    #     self.motor.reference_search(command_type=0,motor=1)
-
-    #     # Loop to monitor the homing process
-    #     # while not self.is_home_position():
-    #     #     print(f'Approaching home position: {self.motor.actual_position}')
-    #     #     time.sleep(0.2)
-    #     while not self.motor.reference_search(command_type=2, motor = 1):
-    #         home_sensor_state=self.motor.get_axis_parameter(self.motor.AP.HomeSwitch)
-    #         print(self.motor.get_axis_parameter(self.motor.AP.HomeSwitch))
-    #         if home_sensor_state==0:
-    #             print("Home sensor detected. Stopping the motor.")
-    #             self.connection.reference_search(command_type=1, motor=1)  # Stop the homing process
-    #             break
-    #         # Check if timeout is exceeded
-    #         if time.time() - start_time > time_out:
-    #             print("Homing procedure timed out. Stopping the motor.")
-    #             self.connection.reference_search(command_type=1,motor=1)
-    #             break
-
-    #         current_position = self.motor.get_axis_parameter(self.motor.AP.ActualPosition)
-    #         current_velocity = self.motor.get_axis_parameter(self.motor.AP.ActualVelocity)
-    #         print(f"Current position: {current_position}, velocity: {current_velocity}, home sensor state: {home_sensor_state}")
-
-    #         #Small sleep to prevent excessive CPU usage
-    #         time.sleep(0.2)
-
-    #     # Set the motor's actual position to 0 after successful homing
-    #     self.motor.actual_position = 0
-    #     print("Homing procedure completed successfully.")
-
+    @timed("polarization.go_to_home_position")
     def go_to_home_position(self):
         time_out=10
         start_time=time.time()
-        print('Starting homing procedure')
+        logger.info('Starting homing procedure')
         # Set reference speed
         self.motor.set_axis_parameter(self.motor.AP.ReferenceSearchSpeed, 5000)
         self.motor.set_axis_parameter(self.motor.AP.RefSwitchSpeed, 500)
@@ -138,27 +88,19 @@ class PolarizationPaddler(TMCM3212):
         self.motor.set_axis_parameter(self.motor.AP.ReferenceSearchMode, 8)
 
         initial_status=self.connection.reference_search(command_type=2,motor=1)
-        print(f'Reference search status initially: {initial_status}')
-        #Start reference search
+        logger.info('Reference search status initially: %s', initial_status)
+        #Start reference search, the module reports its end through WAIT where available
         self.connection.reference_search(command_type=0,motor=1)
-        print('Starting reference search')
-        while True:
-            status=self.connection.reference_search(command_type=2,motor=1)
-            if status == 0:
-                print('Reference search completed')
-                self.connection.reference_search(command_type=1,motor=1)
-                break
-            time.sleep(0.2)
-        # if TMCLCommand.WAIT:
-        #     while self.connection.reference_search(command_type=27,motor=1):
-        #         print(f'Reference status: {self.connection.reference_search(command_type=2,motor=1)}')
-        #         time.sleep(0.2)
-
-            if time.time() - start_time > time_out:
-                print("Homing procedure timed out. Stopping the motor.")
-                self.motor.stop()
+        logger.info('Starting reference search')
+        if not self.module.wait_reference_search(1, time_out - (time.time() - start_time)):
+            # The axis stopped at an arbitrary point, keep its position instead of a false home
+            logger.warning("Homing procedure timed out. Stopping the motor.")
+            self.connection.reference_search(command_type=1,motor=1)
+            return False
+        logger.info('Reference search completed')
 
         self.motor.set_axis_parameter(self.motor.AP.ActualPosition, 0)
+        return True
 
 
 
@@ -1 +1,5 @@
+import logging
 
+# Library modules log through "Motors.*"; applications configure output, e.g. with
+# Motors.log_config.configure_logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
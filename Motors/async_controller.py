@@ -0,0 +1,178 @@
+import asyncio
+import functools
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncTransport:
+    """
+    Serializes the TMCL traffic of one connection for asyncio code.
+
+    pytrinamic connections are blocking, so every call is handed to a single
+    bus worker. Calls from any number of tasks are executed one after the other
+    in submission order and never interleave on the wire, while the event loop
+    stays free for other work.
+
+    Close the transport when done, with `close()` or `async with`, to shut its
+    worker thread down; a later `shared` call then starts a new one.
+    """
+    _shared = weakref.WeakKeyDictionary()
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tmcl-bus")
+
+    @classmethod
+    def shared(cls, connection):
+        """Return the transport used by every async wrapper of `connection`."""
+        transport = cls._shared.get(connection)
+        if transport is None:
+            transport = cls._shared[connection] = cls()
+        return transport
+
+    async def call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def close(self):
+        for connection, transport in list(self._shared.items()):
+            if transport is self:
+                del self._shared[connection]
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # Waits for the calls still queued, so keep the event loop free meanwhile
+        await asyncio.to_thread(self.close)
+
+
+class AsyncTMCM3212:
+    """
+    Awaitable front end for a TMCM3212.
+
+    Waiting is done with `asyncio.sleep`, so moves on several axes, homing and
+    data acquisition can run concurrently in one event loop.
+    """
+    def __init__(self, module, transport=None, poll_interval=0.05):
+        self.module = module
+        self.transport = transport if transport is not None else AsyncTransport.shared(module.connection)
+        self.poll_interval = poll_interval
+
+    async def move_to(self, axis, position, velocity=None):
+        await self.transport.call(self.module.move_to, axis, position, velocity)
+
+    async def stop(self, axis):
+        await self.transport.call(self.module.stop, axis)
+
+    async def read_many(self, axis, aps):
+        return await self.transport.call(self.module.read_many, axis, aps)
+
+    async def snapshot(self, axes=None, aps=None):
+        return await self.transport.call(self.module.snapshot, axes, aps)
+
+    async def wait_position_reached(self, axis, timeout=None):
+        """Wait until `axis` reports PositionReachedFlag, stopping it and raising TimeoutError after `timeout` s."""
+        flag = self.module._MotorTypeA.AP.PositionReachedFlag
+        await self._wait_until(lambda: self.module.read_many(axis, [flag])[flag], axis, timeout)
+
+    async def close(self):
+        """Shut down the transport, also for the other wrappers sharing it."""
+        await asyncio.to_thread(self.transport.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def home(self, axis, mode=None, search_speed=None, switch_speed=None, timeout=10):
+        """
+        Run a reference search on `axis`; once the module reports it finished,
+        zero the position there and mark the axis referenced. On timeout the
+        search is stopped and the position left as it is.
+        """
+        ap = self.module._MotorTypeA.AP
+        settings = {ap.ReferenceSearchMode: mode, ap.ReferenceSearchSpeed: search_speed, ap.RefSwitchSpeed: switch_speed}
+        settings = {key: value for key, value in settings.items() if value is not None}
+        if settings:
+            await self.transport.call(self.module.write_many, axis, settings)
+        await self.transport.call(self.module.start_reference_search, axis)
+        await self._wait_until(lambda: self.module.get_reference_search_status(axis) == 0, axis, timeout,
+                               stop=self.module.stop_reference_search)
+        await self.transport.call(self.module.set_axis_parameter, ap.ActualPosition, axis, 0)
+        await self.transport.call(self.module.set_referenced, axis)
+
+    async def _wait_until(self, done, axis, timeout, stop=None):
+        start_time = time.monotonic()
+        while not await self.transport.call(done):
+            if timeout is not None and time.monotonic() - start_time > timeout:
+                await self.transport.call(self.module.stop if stop is None else stop, axis)
+                raise asyncio.TimeoutError(f"Axis {axis} did not finish within {timeout} s")
+            await asyncio.sleep(self.poll_interval)
+
+
+class AsyncDelayLine:
+    """Awaitable wrapper for a DelayLine, positions in mm."""
+    axis = 0
+
+    def __init__(self, delay, transport=None, poll_interval=0.05):
+        self.delay = delay
+        self.controller = AsyncTMCM3212(delay.module, transport, poll_interval)
+        self.transport = self.controller.transport
+
+    async def move_to(self, position, velocity=None, wait=True, timeout=None):
+        await self.transport.call(self.delay.move_to, self.axis, position, velocity)
+        if wait:
+            await self.controller.wait_position_reached(self.axis, timeout)
+
+    async def wait_position_reached(self, timeout=None):
+        await self.controller.wait_position_reached(self.axis, timeout)
+
+    async def get_position(self):
+        return await self.transport.call(self.delay.get_position)
+
+    async def snapshot(self):
+        return (await self.controller.snapshot([self.axis]))[self.axis]
+
+    async def stop(self):
+        await self.controller.stop(self.axis)
+
+    async def home(self, timeout=10):
+        """
+        Same search as the full DelayLine homing: zero the position once the
+        search has latched the switch and mark the axis referenced.
+        """
+        await self.controller.home(self.axis, mode=7, search_speed=10000, switch_speed=500, timeout=timeout)
+
+
+class AsyncPolarizationPaddler:
+    """Awaitable wrapper for a PolarizationPaddler, positions in degrees."""
+    axis = 1
+
+    def __init__(self, paddler, transport=None, poll_interval=0.05):
+        self.paddler = paddler
+        self.controller = AsyncTMCM3212(paddler.module, transport, poll_interval)
+        self.transport = self.controller.transport
+
+    async def move_to(self, position, velocity=None, wait=True, timeout=None):
+        await self.transport.call(self.paddler.move_to, self.axis, position, velocity)
+        if wait:
+            await self.controller.wait_position_reached(self.axis, timeout)
+
+    async def wait_position_reached(self, timeout=None):
+        await self.controller.wait_position_reached(self.axis, timeout)
+
+    async def get_position(self):
+        return await self.transport.call(self.paddler.get_position)
+
+    async def snapshot(self):
+        return (await self.controller.snapshot([self.axis]))[self.axis]
+
+    async def stop(self):
+        await self.controller.stop(self.axis)
+
+    async def home(self, timeout=10):
+        """Same procedure as PolarizationPaddler.go_to_home_position."""
+        await self.controller.home(self.axis, mode=8, search_speed=5000, switch_speed=500, timeout=timeout)
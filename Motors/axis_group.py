@@ -0,0 +1,124 @@
+import logging
+import time
+
+from pytrinamic.helpers import to_signed_32
+from pytrinamic.tmcl import TMCLCommand
+
+from Motors.tmcl_pipeline import ap_frame
+
+logger = logging.getLogger(__name__)
+
+
+class AxisGroupError(RuntimeError):
+    """Raised when an axis of an AxisGroup fails or times out; `results` holds the outcome of every axis."""
+    def __init__(self, message, results):
+        super().__init__(message)
+        self.results = results
+
+
+class AxisGroup:
+    """
+    Runs reference searches or moves on several axes of one TMCM3212 at once.
+
+    All axes are started together and watched with one combined pipelined
+    status read per poll cycle. The group finishes when every axis is done.
+    If one axis fails (a move stopped on an end switch) or the timeout
+    expires, all axes still running are stopped and AxisGroupError is raised,
+    so the wall time is that of the slowest axis instead of the sum.
+
+    `home` takes {axis: (mode, search_speed, switch_speed)}, where None keeps
+    the current setting, and `move_to` takes {axis: target microsteps}.
+    Each returns {axis: {"seconds": ..., "position": ...}}.
+    """
+    def __init__(self, module, poll_interval=0.01):
+        self.module = module
+        self.poll_interval = poll_interval
+
+    def home(self, searches, timeout=10):
+        ap = self.module._MotorTypeA.AP
+        for axis, (mode, search_speed, switch_speed) in searches.items():
+            settings = {ap.ReferenceSearchMode: mode, ap.ReferenceSearchSpeed: search_speed,
+                        ap.RefSwitchSpeed: switch_speed}
+            self.module.write_many(axis, {key: value for key, value in settings.items() if value is not None})
+        self._request([(TMCLCommand.RFS, 0, axis, 0) for axis in searches])
+
+        def status(axis, values):
+            return "done" if values[axis][0] == 0 else "running"
+
+        results = self._watch(list(searches), [None], status, timeout, reference=True)
+        # The search has latched the switch: zero there and mark the axes as referenced
+        for axis in searches:
+            self.module.write_many(axis, {ap.ActualPosition: 0})
+            self.module.set_referenced(axis)
+            results[axis]["position"] = 0
+        return results
+
+    def move_to(self, targets, timeout=None):
+        ap = self.module._MotorTypeA.AP
+        self._request([(TMCLCommand.MVP, 0, axis, int(position)) for axis, position in targets.items()])
+
+        def status(axis, values):
+            reached, velocity, left, right = values[axis][:4]
+            if reached:
+                return "done"
+            if velocity == 0 and (left or right):
+                return "failed"
+            return "running"
+
+        return self._watch(list(targets), [ap.PositionReachedFlag, ap.ActualVelocity, ap.LeftEndstop,
+                                           ap.RightEndstop], status, timeout)
+
+    def _watch(self, axes, aps, status, timeout, reference=False):
+        ap = self.module._MotorTypeA.AP
+        start_time = time.monotonic()
+        results = {}
+        pending = list(axes)
+        while pending:
+            values = self._poll(pending, aps + [ap.ActualPosition])
+            now = time.monotonic() - start_time
+            failed = []
+            for axis in list(pending):
+                state = status(axis, values)
+                if state == "running":
+                    continue
+                pending.remove(axis)
+                results[axis] = {"seconds": now, "position": values[axis][-1]}
+                if state == "failed":
+                    failed.append(axis)
+            if failed or (pending and timeout is not None and now > timeout):
+                self._stop(pending, reference)
+                for axis in pending:
+                    results[axis] = {"seconds": now, "position": values[axis][-1]}
+                reason = f"axis {failed} failed" if failed else f"axes {pending} timed out after {timeout} s"
+                logger.warning("Axis group stopped: %s", reason)
+                raise AxisGroupError(f"Axis group stopped: {reason}", results)
+            if pending:
+                time.sleep(self.poll_interval)
+        return results
+
+    def _poll(self, axes, aps):
+        """
+        One pipelined batch with, per axis, the values of `aps` in order. None in
+        `aps` stands for the reference search status (RFS type 2).
+        """
+        module = self.module
+        requests = []
+        for axis in axes:
+            for index in aps:
+                if index is None:
+                    requests.append((TMCLCommand.RFS, 2, axis, 0))
+                else:
+                    command_type, motor = ap_frame(index, axis, module.ap_index_bit_width)
+                    requests.append((TMCLCommand.GAP, command_type, motor, 0))
+        replies = iter(self._request(requests))
+        signed = module._MotorTypeA.SIGNED_AP
+        return {axis: [to_signed_32(reply.value) if index in signed else reply.value
+                       for index, reply in zip(aps, replies)] for axis in axes}
+
+    def _stop(self, axes, reference=False):
+        command = (TMCLCommand.RFS, 1) if reference else (TMCLCommand.MST, 0)
+        self._request([(command[0], command[1], axis, 0) for axis in axes])
+
+    def _request(self, frames):
+        module_id = self.module.module_id
+        return self.module.transport.request_many([(module_id,) + frame for frame in frames])
@@ -0,0 +1,173 @@
+"""
+Serial data rate negotiation with a TMCM-3212.
+
+    port = serial.Serial("/dev/ttyUSB0", timeout=0.2)
+    report = negotiate_baud_rate(port)
+    connection = SerialTmclInterface(port)
+
+The module's SerialBaudRate (GP 65) and the host port are raised together to
+the fastest rate that passes an integrity test, and the rate is stored in the
+module's EEPROM so the next start finds it already set. The module is
+expected to answer the SGP at the old rate and switch afterwards; firmware
+that only switches after a reset fails the test and stays at its rate.
+"""
+import logging
+import statistics
+import time
+
+from pytrinamic.connections.serial_tmcl_interface import SerialTmclInterface
+from pytrinamic.tmcl import TMCLCommand, TMCLReplyError
+from serial import SerialException
+
+from .trinamic_controller import TMCM3212
+
+logger = logging.getLogger(__name__)
+
+# SerialBaudRate (GP 65) codes and their data rates
+BAUD_RATES = {0: 9600, 1: 14400, 2: 19200, 3: 28800, 4: 38400, 5: 57600, 6: 76800, 7: 115200,
+              8: 230400, 9: 250000, 10: 500000, 11: 1000000}
+BAUD_CODES = {rate: code for code, rate in BAUD_RATES.items()}
+
+
+def _connection(port, module_id):
+    return SerialTmclInterface(port, module_id=module_id)
+
+
+def _set_port_rate(port, rate):
+    """Switch the host port to `rate`, returns False when the port does not support it."""
+    try:
+        port.baudrate = rate
+    except (SerialException, ValueError, OSError):
+        return False
+    port.reset_input_buffer()
+    return True
+
+
+def probe_baud_rate(port, module_id=1, rates=None):
+    """
+    Find the rate the module currently talks at, trying `rates` (default: all
+    known rates, the port's current rate first). Leaves the port at that rate
+    and returns it, or None when no rate gets a valid answer.
+    """
+    rates = list(BAUD_RATES.values()) if rates is None else list(rates)
+    if port.baudrate in rates:
+        rates.remove(port.baudrate)
+        rates.insert(0, port.baudrate)
+    for rate in rates:
+        if not _set_port_rate(port, rate):
+            continue
+        try:
+            reply = _connection(port, module_id).send(TMCLCommand.GGP, TMCM3212.GP0.SerialBaudRate, 0, 0, module_id)
+        except (RuntimeError, TMCLReplyError):
+            continue
+        if BAUD_RATES.get(reply.value) == rate:
+            return rate
+    port.reset_input_buffer()
+    return None
+
+
+def integrity_test(port, module_id=1, reads=20, reference=None):
+    """
+    Read a fixed set of axis and global parameters `reads` times at the port's
+    current rate and check every reply checksum and value against `reference`
+    ({(command, type, motor): value}); values missing from `reference` are
+    added from their first read.
+
+    Returns (passed, [round trip s, ...]).
+    """
+    connection = _connection(port, module_id)
+    gp = TMCM3212.GP0
+    ap = TMCM3212._MotorTypeA.AP
+    requests = [(TMCLCommand.GGP, gp.SerialBaudRate, 0), (TMCLCommand.GGP, gp.SerialAddress, 0),
+                (TMCLCommand.GAP, ap.MaxVelocity, 0), (TMCLCommand.GAP, ap.MicrostepResolution, 1)]
+    if reference is None:
+        reference = {}
+    round_trips = []
+    for i in range(reads):
+        command, command_type, motor = requests[i % len(requests)]
+        start = time.perf_counter()
+        try:
+            # The connection already rejects replies with a wrong checksum
+            reply = connection.send(command, command_type, motor, 0, module_id)
+        except (RuntimeError, TMCLReplyError) as e:
+            logger.debug("Integrity read failed at %d baud: %s", port.baudrate, e)
+            return False, round_trips
+        round_trips.append(time.perf_counter() - start)
+        expected = reference.setdefault((command, command_type, motor), reply.value)
+        if reply.value != expected:
+            return False, round_trips
+    return True, round_trips
+
+
+def _restore(port, module_id, rate):
+    """Bring the module back to `rate` after a failed switch, wherever it ended up."""
+    code = BAUD_CODES[rate]
+    found = port.baudrate
+    for _ in range(2):
+        try:
+            _connection(port, module_id).send(TMCLCommand.SGP, TMCM3212.GP0.SerialBaudRate, 0, code, module_id)
+        except (RuntimeError, TMCLReplyError):
+            pass
+        if probe_baud_rate(port, module_id, [rate]) == rate:
+            return
+        # The module did not switch back: find where it is and retry from there
+        found = probe_baud_rate(port, module_id)
+        if found is None:
+            break
+    raise ConnectionError(f"Module {module_id} could not be brought back to {rate} baud (last seen at {found})")
+
+
+def negotiate_baud_rate(port, module_id=1, rates=None, reads=20, store=True):
+    """
+    Step module and host up through the `rates` (default: all known rates)
+    above the current one, measuring the round trip at each rate that passes
+    `integrity_test`. At the first rate that fails, the module is brought back
+    to the last good rate and the negotiation ends there.
+
+    With `store` the chosen rate is saved to the module's EEPROM (STGP).
+    Returns {"rate": ..., "stored": ..., "round_trip_ms": {rate: median, or
+    None for rates that failed or the port does not support}}.
+    """
+    gp = TMCM3212.GP0
+    rates = sorted(BAUD_RATES.values() if rates is None else rates)
+    current = probe_baud_rate(port, module_id)
+    if current is None:
+        raise ConnectionError(f"Module {module_id} does not answer at any known data rate")
+    reference = {}
+    passed, round_trips = integrity_test(port, module_id, reads, reference)
+    if not passed:
+        raise ConnectionError(f"Module {module_id} fails the integrity test at its current rate {current}")
+    report = {current: statistics.median(round_trips) * 1e3}
+    logger.info("Module %d talks at %d baud, round trip %.3f ms", module_id, current, report[current])
+
+    for rate in rates:
+        if rate <= current:
+            continue
+        if not _set_port_rate(port, rate) or not _set_port_rate(port, current):
+            report[rate] = None
+            continue
+        # The module answers at the old rate and switches after the reply
+        try:
+            _connection(port, module_id).send(TMCLCommand.SGP, gp.SerialBaudRate, 0, BAUD_CODES[rate], module_id)
+        except (RuntimeError, TMCLReplyError) as e:
+            # The module may or may not have switched
+            passed = False
+            logger.debug("Switching to %d baud failed: %s", rate, e)
+        else:
+            _set_port_rate(port, rate)
+            expected = {**reference, (TMCLCommand.GGP, gp.SerialBaudRate, 0): BAUD_CODES[rate]}
+            passed, round_trips = integrity_test(port, module_id, reads, expected)
+        if not passed:
+            report[rate] = None
+            logger.warning("Integrity test failed at %d baud, falling back to %d", rate, current)
+            _restore(port, module_id, current)
+            break
+        report[rate] = statistics.median(round_trips) * 1e3
+        logger.info("Module %d at %d baud, round trip %.3f ms", module_id, rate, report[rate])
+        current = rate
+
+    stored = False
+    if store:
+        _connection(port, module_id).send(TMCLCommand.STGP, gp.SerialBaudRate, 0, 0, module_id)
+        stored = True
+    return {"rate": current, "stored": stored, "round_trip_ms": report}
@@ -0,0 +1,225 @@
+"""
+Local TMCL broker: one process owns the module connection and serves it to
+other processes over a Unix-domain socket.
+
+    python -m Motors.broker --socket /tmp/tmcm3212.sock --interface serial_tmcl --port /dev/ttyACM0
+
+Clients connect with BrokerConnection, which can be passed to TMCM3212,
+DelayLine or PolarizationPaddler in place of the direct connection.
+"""
+import argparse
+import logging
+import os
+import socket
+import socketserver
+import threading
+
+from pytrinamic.connections.tmcl_interface import TmclInterface
+from pytrinamic.tmcl import TMCLCommand, TMCLReply, TMCLReplyChecksumError, TMCLRequest, TMCLStatus
+
+from .tmcl_pipeline import connection_lock
+
+logger = logging.getLogger(__name__)
+
+FRAME_SIZE = 9
+# SuppressReply (GP 255): the broker waits for a reply to every frame, so it never lets a client set it
+SUPPRESS_REPLY = 255
+
+
+def _recv_frame(sock):
+    data = b""
+    while len(data) < FRAME_SIZE:
+        chunk = sock.recv(FRAME_SIZE - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+class _Read:
+    """A read on its way to the bus, shared by every client asking for the same frame."""
+    __slots__ = ("done", "reply", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.reply = None
+        self.error = None
+
+
+class _ClientHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            data = _recv_frame(self.request)
+            if data is None:
+                return
+            try:
+                reply = self.server.execute(data)
+            except Exception as e:
+                # The client sees the connection drop instead of a wrong reply
+                logger.error("Bus error for client request %s: %s", data.hex(), e)
+                return
+            self.request.sendall(reply)
+
+
+class TmclBroker(socketserver.ThreadingUnixStreamServer):
+    """
+    Serves the TMCL connection `connection` to local clients at the socket `path`.
+
+    Clients exchange raw 9 byte TMCL request and reply frames. Each client is
+    handled by its own thread, and the frames of all clients go to the bus one
+    at a time. A read (GAP, GGP, GIO) arriving while an identical read is still
+    waiting for the bus or on it shares that read's reply instead of adding a
+    bus transaction.
+
+    Switching module replies off (SuppressReply, GP 255) is refused with
+    INVALID_VALUE without reaching the bus.
+    """
+    daemon_threads = True
+    request_queue_size = 64
+    READ_COMMANDS = frozenset((TMCLCommand.GAP, TMCLCommand.GGP, TMCLCommand.GIO))
+
+    def __init__(self, connection, path, coalesce=True):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _ClientHandler)
+        self.connection = connection
+        self.path = path
+        self.coalesce = coalesce
+        self.bus_frames = 0
+        self.coalesced = 0
+        self._bus = connection_lock(connection)
+        self._reads = {}
+        self._reads_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Serve from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, name="tmcl-broker", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def execute(self, data):
+        """Run one request frame on the bus, or join an identical pending read, and return the reply frame."""
+        if data[1] == TMCLCommand.SGP and data[2] == SUPPRESS_REPLY and data[3] == 0 and any(data[4:8]):
+            request = TMCLRequest.from_buffer(data)
+            logger.warning("Refused to switch off the replies of module %d", request.moduleAddress)
+            return bytes(TMCLReply(self.connection._host_id, request.moduleAddress, TMCLStatus.INVALID_VALUE,
+                                   request.command, request.value).to_buffer())
+        if not self.coalesce or data[1] not in self.READ_COMMANDS:
+            with self._bus:
+                return self._transfer(data)
+
+        with self._reads_lock:
+            read = self._reads.get(data)
+            joined = read is not None
+            if not joined:
+                read = self._reads[data] = _Read()
+            else:
+                self.coalesced += 1
+        if joined:
+            read.done.wait()
+        else:
+            with self._bus:
+                try:
+                    read.reply = self._transfer(data)
+                except Exception as e:
+                    read.error = e
+                finally:
+                    # Unregister before the bus is released, so a later read never
+                    # joins one that was answered before it arrived
+                    with self._reads_lock:
+                        del self._reads[data]
+                    read.done.set()
+        if read.error is not None:
+            raise read.error
+        return read.reply
+
+    def stats(self):
+        return {"requests": self.bus_frames + self.coalesced, "bus_frames": self.bus_frames,
+                "coalesced": self.coalesced}
+
+    def _transfer(self, data):
+        connection = self.connection
+        self.bus_frames += 1
+        connection._send(connection._host_id, data[0], data)
+        return bytes(connection._recv(connection._host_id, data[0]))
+
+
+class BrokerConnection(TmclInterface):
+    """
+    pytrinamic TMCL connection to a TmclBroker instead of the module itself.
+
+    Other clients may change parameters at any time, so leave the TMCM3212
+    parameter cache disabled for values another process writes. Every frame
+    must be answered through the broker, so bulk writes are not available.
+    """
+    # The broker waits for a reply to every frame it forwards
+    ACKNOWLEDGED_ONLY = True
+
+    def __init__(self, path, host_id=2, module_id=1, timeout=5.0):
+        TmclInterface.__init__(self, host_id, module_id)
+        self.logger = logging.getLogger("BrokerConnection")
+        self.path = path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # A blocking connect waits for the broker to accept instead of failing
+        # with EAGAIN while its listen backlog is full
+        self._socket.connect(path)
+        self._socket.settimeout(timeout)
+
+    def close(self):
+        self._socket.close()
+
+    def _send(self, host_id, module_id, data):
+        self._socket.sendall(bytes(data))
+
+    def _recv(self, host_id, module_id):
+        data = _recv_frame(self._socket)
+        if data is None:
+            raise ConnectionError(f"TMCL broker at {self.path} closed the connection")
+        return bytearray(data)
+
+    def _reply_check(self, reply):
+        if not reply.is_checksum_correct():
+            raise TMCLReplyChecksumError(reply)
+
+    @staticmethod
+    def list():
+        return []
+
+    def __str__(self):
+        return "Connection: type={} path={}".format(type(self).__name__, self.path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default="/tmp/tmcm3212.sock", help="Unix socket path to serve on")
+    parser.add_argument("--virtual", action="store_true", help="serve the virtual TMCM-3212 instead of hardware")
+    args, connection_args = parser.parse_known_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    if args.virtual:
+        from Motors.virtual_tmcm3212 import virtual_instrument
+        connection = virtual_instrument()
+    else:
+        from pytrinamic.connections import ConnectionManager
+        connection = ConnectionManager(connection_args).connect()
+    broker = TmclBroker(connection, args.socket)
+    logger.info("Serving %s on %s", connection, args.socket)
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.close()
+        connection.close()
+        logger.info("Broker stopped: %s", broker.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import logging
+import time
+
+from pytrinamic.tmcl import TMCLCommand
+
+from .tmcl_pipeline import PipelineError, ap_frame
+
+logger = logging.getLogger(__name__)
+
+
+class BulkWriteError(RuntimeError):
+    """Raised when the readback after a bulk write differs from the values written; `report` has the details."""
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+
+class BulkWrite:
+    """
+    Collects axis parameter writes and sends them with module replies turned off.
+
+        with module.bulk_write() as bulk:
+            bulk.write_many(0, {ap.MaxVelocity: 50000, ap.MaxAcceleration: 80000})
+            bulk.set_axis_parameter(ap.RunCurrent, 1, 12)
+        print(bulk.report)
+
+    On leaving the block, SuppressReply (GP 255) is switched on, the writes are
+    streamed without waiting for replies, spaced by the transmission time of a
+    frame plus PROCESSING_TIME, or the module's TelegramPauseTime if longer.
+    Replies are switched back on and every written parameter is read back in
+    one batch; a difference raises BulkWriteError. Writes the cache already
+    holds are skipped. `report` gives the writes sent, the time taken and the
+    time the same writes would take acknowledged, estimated from the measured
+    round trip of the TelegramPauseTime read.
+
+    The request switching SuppressReply on is still answered, the one switching
+    it off is not; it is sent even when streaming the writes fails. Only writes
+    confirmed by the readback (or all, without `verify`) update the parameter
+    cache, the others are dropped from it.
+
+    Connections that wait for a reply to every frame, such as a
+    BrokerConnection, cannot stream: flush raises RuntimeError on them before
+    anything is sent.
+    """
+    # Time the module needs to execute one SAP before the next frame may arrive
+    PROCESSING_TIME = 0.0005
+
+    def __init__(self, module, verify=True, spacing=None):
+        self.module = module
+        self.verify = verify
+        self.spacing = spacing
+        self.writes = {}
+        self.report = None
+
+    def set_axis_parameter(self, ap_type, axis, value):
+        self.writes[(axis, ap_type)] = int(value)
+
+    def write_many(self, axis, values):
+        for ap_type, value in values.items():
+            self.set_axis_parameter(ap_type, axis, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def flush(self):
+        """Send the collected writes and verify them, returns the report."""
+        module = self.module
+        transport = module.transport
+        module_id = module.module_id
+        gp = module.GP0
+        writes = {}
+        for (axis, ap_type), value in self.writes.items():
+            cache = module.motors[axis].cache
+            if cache is None or cache.should_write(ap_type, value):
+                writes[(axis, ap_type)] = value
+        self.writes = {}
+        if not transport.unacknowledged:
+            raise RuntimeError(f"Bulk writes need a direct connection, {type(module.connection).__name__} "
+                               "waits for a reply to every frame")
+
+        suppress_off = (module_id, TMCLCommand.SGP, gp.SuppressReply, 0, 0)
+        start_time = time.perf_counter()
+        with transport.lock:
+            pause = transport.request_many([(module_id, TMCLCommand.GGP, gp.TelegramPauseTime, 0, 0)])[0]
+            round_trip = time.perf_counter() - start_time
+            spacing = self.spacing
+            if spacing is None:
+                spacing = max(self.frame_time() + self.PROCESSING_TIME, pause.value * 1e-3)
+            requests = [(module_id, TMCLCommand.SAP) + ap_frame(ap_type, axis, module.ap_index_bit_width) + (value,)
+                        for (axis, ap_type), value in writes.items()]
+            try:
+                transport.request_many([(module_id, TMCLCommand.SGP, gp.SuppressReply, 0, 1)])
+            except PipelineError:
+                # The replies may have been switched off before the reply got lost; switching them
+                # back on is answered only if they were not
+                try:
+                    transport.request_many([suppress_off])
+                except PipelineError:
+                    pass
+                raise
+            try:
+                transport.send_unacknowledged(requests, spacing)
+            except Exception:
+                # Part of the writes may have taken effect
+                self._invalidate(writes)
+                raise
+            finally:
+                # Without replies the module would ignore every later request
+                transport.send_unacknowledged([suppress_off], spacing)
+        seconds = time.perf_counter() - start_time
+
+        self.report = {"writes": len(writes), "seconds": seconds, "spacing": spacing,
+                       "acknowledged_estimate": round_trip * (len(writes) + 2), "mismatches": {}}
+        mismatches = {}
+        if self.verify and writes:
+            read = transport.get_axis_parameters(module_id, list(writes), module.ap_index_bit_width,
+                                                 module._MotorTypeA.SIGNED_AP)
+            mismatches = {key: (value, read[key]) for key, value in writes.items() if read[key] != value}
+        # Only values known to have taken effect go to the cache
+        for (axis, ap_type), value in writes.items():
+            cache = module.motors[axis].cache
+            if cache is not None and (axis, ap_type) not in mismatches:
+                cache.written(ap_type, value)
+        self._invalidate(mismatches)
+        self.report["mismatches"] = mismatches
+        if mismatches:
+            logger.warning("Bulk write readback differs for %s", mismatches)
+            raise BulkWriteError(f"{len(mismatches)} of {len(writes)} bulk writes did not take effect", self.report)
+        logger.info("Bulk write of %d parameters in %.1f ms (acknowledged about %.1f ms)", len(writes),
+                    seconds * 1e3, self.report["acknowledged_estimate"] * 1e3)
+        return self.report
+
+    def _invalidate(self, keys):
+        for axis, ap_type in keys:
+            cache = self.module.motors[axis].cache
+            if cache is not None:
+                cache.invalidate(ap_type)
+
+    def frame_time(self):
+        """Transmission time of one 9 byte frame at the connection's serial data rate, 0 if unknown."""
+        datarate = getattr(self.module.connection, "_baudrate", None)
+        return 9 * 10 / datarate if datarate else 0.0
@@ -0,0 +1,132 @@
+import collections
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DeviationSample = collections.namedtuple("DeviationSample", "timestamp actual encoder deviation")
+
+
+class LostStepsError(RuntimeError):
+    """Raised when the encoder falls behind the step counter by more than the allowed deviation."""
+    def __init__(self, message, sample):
+        super().__init__(message)
+        self.sample = sample
+
+
+class ClosedLoopModule:
+    """
+    Closed-loop (encoder feedback) feature of one TMCM-3212 axis.
+
+    `enable` switches ClosedLoopMode on and waits for the module to finish the
+    closed-loop initialization (ClosedLoopInitFlag). `calibrate` runs the
+    encoder offset calibration: the encoder is synchronized to the step counter
+    and the initialization determines CLoffset, which can be stored.
+
+    Deviations are in microsteps: the encoder counts are scaled with the
+    EncoderResolution against the motor full steps and microstep resolution.
+    `monitor` streams ActualPosition against EncoderPosition and raises
+    LostStepsError as soon as the deviation exceeds the limit.
+    """
+    def __init__(self, module, axis, aps):
+        self._parent = module
+        self._axis = axis
+        self._aps = aps
+        self._scale = None
+
+    def is_enabled(self):
+        return self._parent.get_axis_parameter(self._aps.ClosedLoopMode, self._axis) == 1
+
+    def is_initialized(self):
+        return self._parent.get_axis_parameter(self._aps.ClosedLoopInitFlag, self._axis) == 1
+
+    def enable(self, timeout=5.0, poll_interval=0.01):
+        """Switch closed-loop mode on and wait for the initialization. Returns False on timeout."""
+        self._parent.write_many(self._axis, {self._aps.ClosedLoopMode: 1})
+        start_time = time.monotonic()
+        while not self.is_initialized():
+            if time.monotonic() - start_time > timeout:
+                logger.warning("Closed-loop initialization of axis %d timed out after %s s", self._axis, timeout)
+                return False
+            time.sleep(poll_interval)
+        return True
+
+    def disable(self):
+        self._parent.write_many(self._axis, {self._aps.ClosedLoopMode: 0})
+
+    def steps_per_count(self):
+        """Microsteps per encoder count, read once from the motor and encoder resolutions."""
+        if self._scale is None:
+            aps = self._aps
+            values = self._parent.read_many(self._axis, [aps.MotorFullStepResolution, aps.MicrostepResolution,
+                                                         aps.EncoderResolution])
+            microsteps = values[aps.MotorFullStepResolution] * (1 << values[aps.MicrostepResolution])
+            self._scale = microsteps / values[aps.EncoderResolution]
+        return self._scale
+
+    def sync_encoder(self):
+        """Set EncoderPosition to match ActualPosition."""
+        aps = self._aps
+        actual = self._parent.read_many(self._axis, [aps.ActualPosition])[aps.ActualPosition]
+        self._parent.write_many(self._axis, {aps.EncoderPosition: round(actual / self.steps_per_count())})
+
+    def calibrate(self, store=False, timeout=5.0):
+        """
+        Run the encoder offset calibration with the axis at standstill: sync the
+        encoder, re-run the closed-loop initialization and read CLoffset back.
+        With `store` the offset is saved to the EEPROM.
+
+        Returns {"offset": CLoffset, "deviation": deviation after calibration}.
+        """
+        aps = self._aps
+        self._scale = None
+        self.disable()
+        self.sync_encoder()
+        if not self.enable(timeout):
+            raise TimeoutError(f"Closed-loop initialization of axis {self._axis} did not finish in {timeout} s")
+        offset = self._parent.read_many(self._axis, [aps.CLoffset])[aps.CLoffset]
+        if store:
+            self._parent.store_many(self._axis, [aps.CLoffset])
+        deviation = self.sample().deviation
+        logger.info("Axis %d closed-loop offset %d, deviation %.1f microsteps", self._axis, offset, deviation)
+        return {"offset": offset, "deviation": deviation}
+
+    def set_max_deviation(self, steps):
+        """Let the module stop the axis when the encoder deviates by more than `steps` microsteps (0 disables)."""
+        counts = round(steps / self.steps_per_count())
+        self._parent.write_many(self._axis, {self._aps.MaxPositionEncoderDeviation: counts})
+
+    def max_deviation(self):
+        """MaxPositionEncoderDeviation in microsteps, 0 when disabled."""
+        aps = self._aps
+        counts = self._parent.read_many(self._axis, [aps.MaxPositionEncoderDeviation])
+        return counts[aps.MaxPositionEncoderDeviation] * self.steps_per_count()
+
+    def sample(self):
+        """ActualPosition and EncoderPosition in one batch, as a DeviationSample in microsteps."""
+        aps = self._aps
+        values = self._parent.read_many(self._axis, [aps.ActualPosition, aps.EncoderPosition])
+        actual = values[aps.ActualPosition]
+        encoder = values[aps.EncoderPosition] * self.steps_per_count()
+        return DeviationSample(time.monotonic(), actual, encoder, actual - encoder)
+
+    def monitor(self, interval=0.01, duration=None, limit=None):
+        """
+        Yield a DeviationSample every `interval` s, for `duration` s or until
+        the caller stops iterating.
+
+        `limit` is the allowed deviation in microsteps, by default the module's
+        MaxPositionEncoderDeviation; a deviation beyond it raises LostStepsError.
+        """
+        if limit is None:
+            limit = self.max_deviation() or None
+        start_time = time.monotonic()
+        while duration is None or time.monotonic() - start_time < duration:
+            sample = self.sample()
+            if limit is not None and abs(sample.deviation) > limit:
+                logger.error("Axis %d lost steps: deviation %.1f microsteps exceeds %s",
+                             self._axis, sample.deviation, limit)
+                raise LostStepsError(f"Axis {self._axis} deviates {sample.deviation:.1f} microsteps from "
+                                     f"its encoder (limit {limit})", sample)
+            yield sample
+            time.sleep(interval)
@@ -0,0 +1,231 @@
+"""
+Several TMCM-3212 modules on one RS485 or CAN bus.
+
+    fleet = Fleet(connection)
+    fleet.discover(range(1, 5))
+    fleet.assign_group(100)
+    with fleet:
+        fleet.start_polling(["ActualPosition", "ActualVelocity"], rate_hz=200)
+        fleet.submit(2, [(TMCLCommand.MVP, 0, 1, 20000)])
+        ...
+        fleet.stop_all()
+"""
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from pytrinamic.tmcl import TMCLCommand, TMCLReplyError, TMCLRequest
+
+from .tmcl_pipeline import ap_frame, connection_lock
+from .trinamic_controller import TMCM3212
+
+logger = logging.getLogger(__name__)
+
+
+class Fleet:
+    """
+    The TMCM3212 modules on the bus of `connection`, with one scheduler
+    thread owning the bus while the fleet runs.
+
+    Command batches submitted for different modules are executed round-robin,
+    one batch per module in turn, so a busy module cannot hold up the others.
+    Polling reads one module per tick in rotation at a fixed aggregate rate of
+    `rate_hz` batches per second, between the command batches.
+
+    `assign_group` gives every module the same secondary address (GP 87), so a
+    single frame sent to that address reaches the same axis of every module:
+    `stop_all` stops the whole rack with one MST per axis number, three frames
+    for TMCM-3212 modules however many there are. Every axis stays
+    in its own group (GroupIndex 0), so commands sent to one axis move only
+    that axis. Frames to the secondary address are not answered.
+
+    While the fleet runs, send all traffic of the bus through it.
+    """
+    def __init__(self, connection, module_ids=(), ap_index_bit_width=8):
+        self.connection = connection
+        self.ap_index_bit_width = ap_index_bit_width
+        self.modules = {}
+        for module_id in module_ids:
+            self.add(module_id)
+        self.group_address = None
+        self.latest = {}
+        self.polls = 0
+        self._queues = collections.OrderedDict()
+        self._bus = connection_lock(connection)
+        self._wakeup = threading.Condition()
+        self._poll = None
+        self._thread = None
+        self._running = False
+
+    def add(self, module_id):
+        module = self.modules[module_id] = TMCM3212.shared(self.connection, module_id, self.ap_index_bit_width)
+        return module
+
+    def discover(self, addresses, probe_timeout=0.05):
+        """
+        Add the modules answering at `addresses` and return their ids. A serial
+        connection waits `probe_timeout` s for each answer instead of its own
+        timeout, so probing absent addresses stays quick.
+        """
+        found = []
+        connection = self.connection
+        with self._bus:
+            adjustable = hasattr(connection, "set_timeout")
+            if adjustable:
+                previous = connection.get_timeout()
+                connection.set_timeout(probe_timeout)
+            try:
+                for address in addresses:
+                    try:
+                        connection.send(TMCLCommand.GET_FIRMWARE_VERSION, 1, 0, 0, address)
+                    except (RuntimeError, TMCLReplyError):
+                        continue
+                    found.append(address)
+            finally:
+                if adjustable:
+                    connection.set_timeout(previous or 0)
+        for module_id in found:
+            self.add(module_id)
+        logger.info("Found modules %s", found)
+        return found
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._schedule, name="tmcl-fleet", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # Commands
+    def submit(self, module_id, frames):
+        """
+        Queue the (command, type, motor, value) `frames` for `module_id` as one
+        pipelined batch. Returns a Future of the replies.
+        """
+        future = Future()
+        with self._wakeup:
+            self._queues.setdefault(module_id, collections.deque()).append((frames, future))
+            self._wakeup.notify()
+        return future
+
+    def request(self, module_id, frames, timeout=None):
+        """Submit `frames` and wait for the replies."""
+        return self.submit(module_id, frames).result(timeout)
+
+    # Group addressing
+    def assign_group(self, address):
+        """
+        Give every module the secondary address `address`. GroupIndex is cleared
+        on every axis, so an axis never moves along with another one of its module.
+        """
+        ap = TMCM3212._MotorTypeA.AP
+        for module_id, module in self.modules.items():
+            frames = [(TMCLCommand.SGP, TMCM3212.GP0.serialSecondaryAddress, 0, address)]
+            frames += [(TMCLCommand.SAP,) + ap_frame(ap.GroupIndex, axis, self.ap_index_bit_width) + (0,)
+                       for axis in range(len(module.motors))]
+            self._run(module_id, frames)
+        self.group_address = address
+
+    def broadcast(self, command, command_type=0, motor=0, value=0):
+        """Send one frame to the group address, ahead of any queued batches. No reply is expected."""
+        if self.group_address is None:
+            raise RuntimeError("No group address assigned, call assign_group first")
+        data = TMCLRequest(self.group_address, command, command_type, motor, value).to_buffer()
+        with self._bus:
+            self.connection._send(self.connection._host_id, self.group_address, data)
+
+    def stop_all(self):
+        """
+        Stop every axis of every module: with a group address one MST frame per
+        axis number (three for TMCM-3212 modules), else one batch per module.
+        """
+        if self.group_address is not None:
+            for axis in range(max((len(module.motors) for module in self.modules.values()), default=0)):
+                self.broadcast(TMCLCommand.MST, motor=axis)
+            return
+        for module_id, module in self.modules.items():
+            self._run(module_id, [(TMCLCommand.MST, 0, axis, 0) for axis in range(len(module.motors))])
+
+    # Polling
+    def start_polling(self, aps, rate_hz=100, axes=None):
+        """
+        Read the AP names `aps` of `axes` (all by default) from one module per
+        tick, rotating over the modules, `rate_hz` ticks per second. The newest
+        values of each module are in `latest[module_id]` as
+        {"timestamp": ..., axis: {ap_name: value}}.
+        """
+        with self._wakeup:
+            self._poll = {"aps": list(aps), "axes": axes, "interval": 1 / rate_hz, "next": time.monotonic(),
+                          "order": collections.deque(self.modules)}
+            self._wakeup.notify()
+
+    def stop_polling(self):
+        with self._wakeup:
+            self._poll = None
+
+    # Scheduler
+    def _schedule(self):
+        while True:
+            with self._wakeup:
+                while self._running:
+                    poll_due = self._poll is not None and time.monotonic() >= self._poll["next"]
+                    if poll_due or any(self._queues.values()):
+                        break
+                    timeout = None if self._poll is None else self._poll["next"] - time.monotonic()
+                    self._wakeup.wait(timeout)
+                if not self._running:
+                    break
+                poll = self._poll if poll_due else None
+                batch = None if poll_due else self._next_batch()
+            if poll is not None:
+                self._poll_next(poll)
+            elif batch is not None:
+                module_id, frames, future = batch
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(self._run(module_id, frames))
+                    except Exception as e:
+                        future.set_exception(e)
+
+    def _next_batch(self):
+        """Take one batch from the next module with queued batches and move that module to the back."""
+        for module_id, queue in self._queues.items():
+            if queue:
+                frames, future = queue.popleft()
+                self._queues.move_to_end(module_id)
+                return module_id, frames, future
+        return None
+
+    def _poll_next(self, poll):
+        poll["next"] += poll["interval"]
+        # After a stall, resume at the fixed rate instead of catching up with a burst
+        poll["next"] = max(poll["next"], time.monotonic())
+        order = poll["order"]
+        if not order:
+            return
+        module_id = order[0]
+        order.rotate(-1)
+        with self._bus:
+            values = self.modules[module_id].snapshot(poll["axes"], poll["aps"])
+        values["timestamp"] = time.monotonic()
+        self.latest[module_id] = values
+        self.polls += 1
+
+    def _run(self, module_id, frames):
+        with self._bus:
+            return self.modules[module_id].transport.request_many([(module_id,) + frame for frame in frames])
@@ -0,0 +1,119 @@
+import bisect
+import time
+
+import numpy as np
+
+
+class FlyScanResult:
+    """
+    Position samples of a fly scan with host monotonic timestamps.
+
+    Calling the result with a timestamp (`time.monotonic()` clock) returns the
+    delay position in mm, linearly interpolated between the two neighbouring
+    samples. Encoder positions are used when they were recorded.
+    """
+    def __init__(self, timestamps, positions_mm, encoder_mm=None):
+        self.timestamps = timestamps
+        self.positions_mm = positions_mm
+        self.encoder_mm = encoder_mm
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def sample_rate(self):
+        """Achieved sampling rate in Hz."""
+        if len(self.timestamps) < 2:
+            return 0.0
+        return (len(self.timestamps) - 1) / (self.timestamps[-1] - self.timestamps[0])
+
+    def __call__(self, timestamp):
+        return self.position_at(timestamp)
+
+    def position_at(self, timestamp):
+        positions = self.encoder_mm if self.encoder_mm is not None else self.positions_mm
+        times = self.timestamps
+        i = bisect.bisect_left(times, timestamp)
+        if i <= 0:
+            return positions[0]
+        if i >= len(times):
+            return positions[-1]
+        t0, t1 = times[i - 1], times[i]
+        p0, p1 = positions[i - 1], positions[i]
+        return p0 + (p1 - p0) * (timestamp - t0) / (t1 - t0) if t1 != t0 else p1
+
+
+def fly_scan(delay, start_mm, stop_mm, velocity, encoder=False, timeout=60):
+    """
+    Sweep `delay` from `start_mm` to `stop_mm` at the constant `velocity`
+    (microsteps/s) while sampling its position as fast as the bus allows.
+
+    The stage is first parked a run-up distance before `start_mm`, so it is
+    already at `velocity` when it enters the range, and the move target lies a
+    run-out distance past `stop_mm`. Raises ValueError when the travel leaves
+    no room for them, naming the range that can be scanned at `velocity`.
+    Encoder counts are converted with the encoder resolution of the axis, and
+    their offset to the step counter is latched at the run-up position, so the
+    encoder positions share the step counter's zero whatever EncoderPosition
+    read before the scan. Returns a FlyScanResult.
+    """
+    module = delay.module
+    ap = delay.motor.AP
+    axis = 0
+    mm = delay.mm
+    direction = 1 if stop_mm >= start_mm else -1
+    (start, stop), clamped = mm.to_steps([start_mm, stop_mm])
+    if clamped.any():
+        raise ValueError(f"Fly scan range {start_mm}..{stop_mm} mm lies outside the travel")
+
+    model = module.ramp_model(axis)
+    model.max_velocity = abs(velocity)
+    # Distance needed to ramp between standstill and the scan velocity
+    ramp = int((model.max_velocity ** 2 - model.start_velocity ** 2) / (2 * max(model.max_acceleration, 1))) + 1
+    run_up = int(start) - direction * ramp
+    run_out = int(stop) + direction * ramp
+    if not (mm.min_steps <= run_up <= mm.max_steps and mm.min_steps <= run_out <= mm.max_steps):
+        first, last = (mm.min_steps + ramp, mm.max_steps - ramp)[::direction]
+        raise ValueError(f"No room to reach {velocity} microsteps/s before {start_mm} mm and to brake after "
+                         f"{stop_mm} mm; at this velocity the scan must stay within "
+                         f"{float(mm.from_steps(first)):.3f}..{float(mm.from_steps(last)):.3f} mm")
+
+    saved_velocity = module.read_many(axis, [ap.MaxVelocity])[ap.MaxVelocity]
+    delay.connection.move_to(axis, run_up, delay.module_id)
+    if not module.wait_until_reached(axis, timeout):
+        raise TimeoutError(f"Fly scan run-up position {run_up} not reached within {timeout} s")
+    if encoder:
+        steps_per_count = delay.motor.closed_loop.steps_per_count()
+        # Standing at the run-up position, encoder and step counter show the same place
+        armed = module.read_many(axis, [ap.ActualPosition, ap.EncoderPosition])
+        encoder_offset = armed[ap.ActualPosition] - armed[ap.EncoderPosition] * steps_per_count
+
+    aps = [ap.ActualPosition, ap.EncoderPosition] if encoder else [ap.ActualPosition]
+    timestamps, positions, encoders = [], [], []
+    try:
+        module.set_axis_parameter(ap.MaxVelocity, axis, abs(velocity))
+        delay.connection.move_to(axis, run_out, delay.module_id)
+        start_time = time.monotonic()
+        while True:
+            before = time.monotonic()
+            values = module.read_many(axis, aps)
+            after = time.monotonic()
+            position = values[ap.ActualPosition]
+            timestamps.append((before + after) / 2)
+            positions.append(position)
+            if encoder:
+                encoders.append(values[ap.EncoderPosition])
+            if (position - stop) * direction >= 0 or position == run_out:
+                # Past the range: brake within the run-out distance
+                delay.stop(axis)
+                break
+            if after - start_time > timeout:
+                delay.stop(axis)
+                raise TimeoutError(f"Fly scan did not pass {stop_mm} mm within {timeout} s")
+    finally:
+        module.set_axis_parameter(ap.MaxVelocity, axis, saved_velocity)
+
+    encoder_mm = None
+    if encoder:
+        encoder_mm = mm.from_steps(np.asarray(encoders, dtype=np.float64) * steps_per_count + encoder_offset).tolist()
+    return FlyScanResult(timestamps, mm.from_steps(positions).tolist(), encoder_mm)
@@ -0,0 +1,60 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+
+def configure_logging(filename, level=logging.INFO, fmt="%(asctime)s - %(message)s", logger=None):
+    """
+    Route `logger` (the root logger by default) to `filename` through a queue.
+
+    Records are only put on a queue by the calling thread; a QueueListener
+    thread formats them and does the file I/O. Returns the listener, which is
+    also stopped (and the queue flushed) at interpreter exit.
+    """
+    records = queue.SimpleQueue()
+    handler = logging.FileHandler(filename)
+    handler.setFormatter(logging.Formatter(fmt))
+    listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+
+    target = logging.getLogger(logger)
+    target.addHandler(logging.handlers.QueueHandler(records))
+    target.setLevel(level)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener):
+    # QueueListener.stop fails when the listener was already stopped by hand
+    if listener._thread is not None:
+        listener.stop()
+
+
+_call_sites = {}
+
+
+def log_limited(logger, level, interval, msg, *args):
+    """
+    Log at most once per `interval` s from the calling line, for use in poll loops.
+
+    The message is only formatted when it is emitted, and the number of calls
+    suppressed since the last one is appended to it.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    caller = sys._getframe(1)
+    key = (caller.f_code, caller.f_lineno)
+    now = time.monotonic()
+    state = _call_sites.get(key)
+    if state is not None and now - state[0] < interval:
+        state[1] += 1
+        return
+    suppressed = state[1] if state is not None else 0
+    _call_sites[key] = [now, 0]
+    if suppressed:
+        logger.log(level, msg + " (%d similar suppressed)", *args, suppressed, stacklevel=2)
+    else:
+        logger.log(level, msg, *args, stacklevel=2)
@@ -0,0 +1,276 @@
+"""
+TMCL traffic and operation timing.
+
+    from Motors import metrics
+    metrics.instrument(connection)
+    metrics.serve(9464)          # Prometheus text at http://localhost:9464/metrics
+    ...
+    metrics.REGISTRY.snapshot()
+
+`instrument` wraps the raw frame I/O of a connection, so every frame is
+counted per command and type (the AP or GP number for parameter commands),
+whether it comes from pytrinamic, the pipelined transport or a bulk write.
+Spans time high-level operations; they cost one attribute check while the
+registry is disabled.
+"""
+import bisect
+import collections
+import functools
+import http.server
+import threading
+import time
+
+from pytrinamic.tmcl import TMCLCommand
+
+# Upper bounds of the latency histogram buckets in s
+BUCKETS = (50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3, 100e-3, 250e-3, 1.0, 2.5,
+           10.0, float("inf"))
+
+FRAME_SIZE = 9
+# SuppressReply global parameter (GP 255)
+SUPPRESS_REPLY = 255
+
+
+class _Histogram:
+    __slots__ = ("count", "sum", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def to_dict(self):
+        return {"count": self.count, "sum_s": self.sum,
+                "buckets": {bound: count for bound, count in zip(BUCKETS, self.buckets)}}
+
+
+class _CommandStats:
+    __slots__ = ("requests", "replies", "bytes", "latency")
+
+    def __init__(self):
+        self.requests = 0
+        self.replies = 0
+        self.bytes = 0
+        self.latency = _Histogram()
+
+
+class Metrics:
+    """
+    Counters per (command, type) and span durations per name.
+
+    `requests` counts frames sent and `replies` the answers matched to them;
+    the difference is frames that got no reply (suppressed or broadcast).
+    Latency runs from sending a frame to receiving its reply, so for pipelined
+    batches it includes the time queued behind the earlier frames.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.commands = {}
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.commands = {}
+            self.spans = {}
+
+    def sent(self, command, command_type):
+        with self._lock:
+            stats = self.commands.get((command, command_type))
+            if stats is None:
+                stats = self.commands[(command, command_type)] = _CommandStats()
+            stats.requests += 1
+            stats.bytes += FRAME_SIZE
+
+    def replied(self, command, command_type, seconds):
+        with self._lock:
+            stats = self.commands.get((command, command_type))
+            # Sent before a reset or into another registry
+            if stats is None:
+                return
+            stats.replies += 1
+            stats.bytes += FRAME_SIZE
+            stats.latency.observe(seconds)
+
+    def observe_span(self, name, seconds):
+        with self._lock:
+            histogram = self.spans.get(name)
+            if histogram is None:
+                histogram = self.spans[name] = _Histogram()
+            histogram.observe(seconds)
+
+    def span(self, name):
+        """Context manager timing the block as span `name`, a no-op while disabled."""
+        return _Span(self, name) if self.enabled else _NO_SPAN
+
+    def snapshot(self):
+        """Current values as a plain dict."""
+        with self._lock:
+            commands = {f"{_command_name(command)} {command_type}": {
+                "command": _command_name(command), "type": command_type, "requests": stats.requests,
+                "replies": stats.replies, "bytes": stats.bytes, "latency": stats.latency.to_dict()}
+                for (command, command_type), stats in sorted(self.commands.items())}
+            spans = {name: histogram.to_dict() for name, histogram in sorted(self.spans.items())}
+        return {"commands": commands, "spans": spans}
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = ["# TYPE tmcl_requests_total counter", "# TYPE tmcl_replies_total counter",
+                 "# TYPE tmcl_bytes_total counter", "# TYPE tmcl_latency_seconds histogram"]
+        for stats in snapshot["commands"].values():
+            labels = f'command="{stats["command"]}",type="{stats["type"]}"'
+            lines.append(f"tmcl_requests_total{{{labels}}} {stats['requests']}")
+            lines.append(f"tmcl_replies_total{{{labels}}} {stats['replies']}")
+            lines.append(f"tmcl_bytes_total{{{labels}}} {stats['bytes']}")
+            lines.extend(_histogram_lines("tmcl_latency_seconds", labels, stats["latency"]))
+        lines.append("# TYPE operation_seconds histogram")
+        for name, histogram in snapshot["spans"].items():
+            lines.extend(_histogram_lines("operation_seconds", f'operation="{name}"', histogram))
+        return "\n".join(lines) + "\n"
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe_span(self.name, time.perf_counter() - self.start)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+# Registry used by `instrument`, `timed` and `serve` unless told otherwise
+REGISTRY = Metrics()
+
+
+@functools.lru_cache(maxsize=None)
+def _command_name(command):
+    name = TMCLCommand.get_name(command)
+    return str(command) if name == "UNKNOWN" else name
+
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in histogram["buckets"].items():
+        cumulative += count
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram['sum_s']}")
+    lines.append(f"{name}_count{{{labels}}} {histogram['count']}")
+    return lines
+
+
+def timed(name, registry=None):
+    """Decorator recording every call of the function as span `name`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            metrics = REGISTRY if registry is None else registry
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            with _Span(metrics, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument(connection, registry=None):
+    """
+    Record the frames of `connection` (a pytrinamic TmclInterface) in
+    `registry` and enable it. Replies are matched to the oldest outstanding
+    frame with the same command; older frames without a reply are dropped.
+    Frames sent to a module while its replies are suppressed (SuppressReply,
+    GP 255) expect no reply and are only counted.
+    """
+    metrics = REGISTRY if registry is None else registry
+    if getattr(connection, "_metrics", None) is not None:
+        connection._metrics = metrics
+        metrics.enabled = True
+        return metrics
+    send = connection._send
+    recv = connection._recv
+    pending = collections.deque()
+    suppressed = set()
+    clock = time.perf_counter
+
+    def _send(host_id, module_id, data):
+        start = clock()
+        send(host_id, module_id, data)
+        address, command, command_type = data[0], data[1], data[2]
+        answered = address not in suppressed
+        if command == TMCLCommand.SGP and command_type == SUPPRESS_REPLY and data[3] == 0:
+            # Frames still waiting when replies are switched are not answered any more
+            pending.clear()
+            if any(data[4:8]):
+                suppressed.add(address)
+            elif not answered:
+                # The frame switching replies back on is not answered either
+                suppressed.discard(address)
+        if connection._metrics.enabled:
+            connection._metrics.sent(command, command_type)
+            if answered:
+                pending.append((command, command_type, start))
+
+    def _recv(host_id, module_id):
+        data = recv(host_id, module_id)
+        now = clock()
+        command = data[3]
+        while pending:
+            sent_command, command_type, start = pending.popleft()
+            if sent_command == command:
+                connection._metrics.replied(command, command_type, now - start)
+                break
+        return data
+
+    connection._metrics = metrics
+    connection._send = _send
+    connection._recv = _recv
+    metrics.enabled = True
+    return metrics
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=9464, host="127.0.0.1", registry=None):
+    """Serve the metrics at http://host:port/metrics from a daemon thread. Returns the server; call shutdown() to stop."""
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = REGISTRY if registry is None else registry
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,108 @@
+import math
+
+
+class LinearRampModel:
+    """
+    Trapezoidal velocity profile of the TMCM-3212 linear ramp.
+
+    Positions are in microsteps, velocities in microsteps/s and accelerations
+    in microsteps/s^2, i.e. the units of the MaxVelocity and MaxAcceleration
+    axis parameters. The motor jumps to StartVelocity when it starts and from
+    StopVelocity to standstill when it arrives.
+    """
+    def __init__(self, max_velocity, max_acceleration, start_velocity=0, stop_velocity=0):
+        self.max_velocity = abs(max_velocity)
+        self.max_acceleration = abs(max_acceleration)
+        self.start_velocity = min(abs(start_velocity), self.max_velocity)
+        self.stop_velocity = min(abs(stop_velocity), self.max_velocity)
+
+    @classmethod
+    def from_parameters(cls, values, ap):
+        """Build the model from a {ap: value} dict as returned by TMCM3212.read_many."""
+        return cls(values[ap.MaxVelocity], values[ap.MaxAcceleration],
+                   values.get(ap.StartVelocity, 0), values.get(ap.StopVelocity, 0))
+
+    def move_time(self, distance, velocity=0):
+        """
+        Predicted duration in s of a move over `distance` microsteps, starting at
+        `velocity` (signed, positive meaning towards the target).
+        """
+        distance = abs(distance)
+        a = self.max_acceleration
+        v_max = self.max_velocity
+        if a <= 0 or v_max <= 0:
+            return 0.0 if distance == 0 else math.inf
+
+        t = 0.0
+        if velocity < 0:
+            # Moving away from the target: brake to standstill first
+            t += -velocity / a
+            distance += velocity * velocity / (2 * a)
+            velocity = 0
+        if distance == 0:
+            return t
+
+        v_start = min(max(velocity, self.start_velocity), v_max)
+        v_end = self.stop_velocity
+        accel_distance = (v_max * v_max - v_start * v_start) / (2 * a)
+        decel_distance = (v_max * v_max - v_end * v_end) / (2 * a)
+
+        if accel_distance + decel_distance <= distance:
+            cruise = distance - accel_distance - decel_distance
+            return t + (v_max - v_start) / a + cruise / v_max + (v_max - v_end) / a
+
+        # Triangular profile, the cruise velocity is never reached
+        v_peak = math.sqrt(max((2 * a * distance + v_start * v_start + v_end * v_end) / 2, 0))
+        if v_peak < v_start:
+            # Too fast to stop in time, decelerate over the whole distance
+            v_arrive = math.sqrt(max(v_start * v_start - 2 * a * distance, 0))
+            return t + (v_start - v_arrive) / a
+        return t + (v_peak - v_start) / a + (v_peak - min(v_end, v_peak)) / a
+
+    def peak_velocity(self, distance):
+        """Highest velocity reached on a move over `distance` microsteps from standstill."""
+        a = self.max_acceleration
+        v_start = self.start_velocity
+        v_end = self.stop_velocity
+        return min(self.max_velocity,
+                   math.sqrt(max((2 * a * abs(distance) + v_start * v_start + v_end * v_end) / 2, 0)))
+
+
+class RampPlanner:
+    """
+    Chooses the linear ramp parameters of each move for the shortest predicted
+    move time within the allowed limits of an axis.
+
+    The full acceleration is always used. MaxVelocity only needs to cover the
+    peak a move can reach: on a short move any cruise velocity at or above
+    that peak gives the same time, so the current value is kept when it does
+    and stays within the limit. StartVelocity and StopVelocity are raised to
+    their limits (0 leaves them alone). `plan` returns only the parameters that
+    differ from `current`, so moves of similar length cause no writes.
+    """
+    def __init__(self, max_velocity, max_acceleration, max_start_velocity=0, max_stop_velocity=0):
+        self.max_velocity = max_velocity
+        self.max_acceleration = max_acceleration
+        self.max_start_velocity = min(max_start_velocity, max_velocity)
+        self.max_stop_velocity = min(max_stop_velocity, max_velocity)
+
+    def plan(self, distance, current, ap):
+        """
+        Parameters for a move over `distance` microsteps from standstill, given
+        the `current` {ap: value} ramp parameters.
+
+        Returns ({ap: value} to write, LinearRampModel of the planned ramp).
+        """
+        settings = {ap.MaxAcceleration: self.max_acceleration}
+        if self.max_start_velocity:
+            settings[ap.StartVelocity] = self.max_start_velocity
+        if self.max_stop_velocity:
+            settings[ap.StopVelocity] = self.max_stop_velocity
+        values = {**current, **settings}
+        peak = LinearRampModel(self.max_velocity, self.max_acceleration, values.get(ap.StartVelocity, 0),
+                               values.get(ap.StopVelocity, 0)).peak_velocity(distance)
+        velocity = current.get(ap.MaxVelocity, 0)
+        if not peak <= velocity <= self.max_velocity:
+            values[ap.MaxVelocity] = min(self.max_velocity, math.ceil(peak))
+        changes = {index: value for index, value in values.items() if current.get(index) != value}
+        return changes, LinearRampModel.from_parameters(values, ap)
@@ -0,0 +1,68 @@
+class AxisParameterCache:
+    """
+    Write-through cache for the host-owned axis parameters of one axis.
+
+    Only parameters listed in `cacheable` are kept; everything else (positions,
+    velocities, flags, load values) always goes to the module. Writes are still
+    sent to the module unless the cached value is already the one being written.
+    Parameters written since the last STAP are tracked in `dirty`.
+    """
+    def __init__(self, cacheable):
+        self.cacheable = frozenset(cacheable)
+        self.values = {}
+        self.dirty = set()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.skipped_writes = 0
+
+    def get(self, ap_type):
+        """Return the cached value of `ap_type`, or None on a miss."""
+        if ap_type not in self.cacheable:
+            return None
+        value = self.values.get(ap_type)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def update(self, ap_type, value):
+        """Remember `value` read back from the module."""
+        if ap_type in self.cacheable:
+            self.values[ap_type] = value
+
+    def should_write(self, ap_type, value):
+        """Return False when writing `value` would not change the module state."""
+        if ap_type in self.cacheable and self.values.get(ap_type) == value:
+            self.skipped_writes += 1
+            return False
+        return True
+
+    def written(self, ap_type, value):
+        self.writes += 1
+        if ap_type in self.cacheable:
+            self.values[ap_type] = value
+            self.dirty.add(ap_type)
+
+    def stored(self, ap_type):
+        self.dirty.discard(ap_type)
+
+    def invalidate(self, ap_type=None):
+        """Forget `ap_type`, or every cached value when no type is given."""
+        if ap_type is None:
+            self.values.clear()
+            self.dirty.clear()
+        else:
+            self.values.pop(ap_type, None)
+            self.dirty.discard(ap_type)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "skipped_writes": self.skipped_writes,
+            "cached": len(self.values),
+            "dirty": len(self.dirty),
+        }
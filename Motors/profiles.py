@@ -0,0 +1,73 @@
+import zlib
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+
+# Axis configuration per role, as {AP name: value}.
+DELAY_LINE = {
+    "RunCurrent": 8,               # 0.40A
+    "StandbyCurrent": 0,
+    "MicrostepResolution": 8,      # 256 microsteps
+    "MaxAcceleration": 30000,
+    "MaxVelocity": 30000,
+    "FreewheelingMode": 3,
+    "PWMGrad": 1,
+    "PWMAmplitude": 64,
+    "PWMAutoscale": 1,
+    "PWMThresholdSpeed": 51200,
+}
+
+POLARIZATION_PADDLER = {
+    "StandbyCurrent": 0,
+    "MicrostepResolution": 8,      # 256 microsteps
+    "MaxAcceleration": 30000,
+    "MaxVelocity": 30000,
+}
+
+PROFILES = {
+    "delay_line": DELAY_LINE,
+    "polarization_paddler": POLARIZATION_PADDLER,
+}
+
+
+def load_profiles(path):
+    """
+    Load named profiles from a TOML file with one table per axis role, e.g.
+
+        [delay_line]
+        RunCurrent = 8
+        MaxVelocity = 30000
+    """
+    if tomllib is None:
+        raise RuntimeError("Loading TOML profiles requires Python 3.11 or newer")
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    return {name: {key: int(value) for key, value in table.items()} for name, table in data.items()}
+
+
+def save_profiles(path, profiles):
+    """Write named profiles as a TOML file that `load_profiles` reads back."""
+    lines = []
+    for name, profile in profiles.items():
+        if lines:
+            lines.append("")
+        lines.append(f"[{name}]")
+        lines.extend(f"{key} = {int(value)}" for key, value in profile.items())
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def get_profile(profile, profiles=None):
+    """Resolve `profile`, given either by name or as a {AP name: value} dict."""
+    if isinstance(profile, str):
+        return (PROFILES if profiles is None else profiles)[profile]
+    return profile
+
+
+def profile_hash(profile):
+    """32 bit hash of a profile, independent of the key order."""
+    text = ";".join(f"{name}={int(value)}" for name, value in sorted(profile.items()))
+    return zlib.crc32(text.encode("ascii"))
@@ -1,18 +1,14 @@
-import sys
-import os
 import time
 import logging
 from pytrinamic.connections import ConnectionManager
 from Motors.Delay_line import DelayLine
+from Motors.log_config import configure_logging, log_limited
 
-# Setup logging configuration to write to rotate_delay_log.txt
-logging.basicConfig(filename="rotate_delay_log.txt", 
-                    level=logging.INFO, 
-                    format="%(asctime)s - %(message)s")
+logger = logging.getLogger(__name__)
 
 def main():
     try:
-        logging.info("Starting rotate_delay procedure")
+        logger.info("Starting rotate_delay procedure")
         
         # Initialize the ConnectionManager and connect to the motor
         connection_manager = ConnectionManager()  # Use real connection here
@@ -26,43 +22,48 @@ def main():
             time_out = 10
             start_time = time.time()
 
-            logging.info(f"Moving the delay line to target position: {target_position}")
+            logger.info("Moving the delay line to target position: %s", target_position)
             
             # Move the motor to the target position
             delay.move_to(axis=0, position=target_position)
             
-            # Monitor the motor's position during movement
-            while not delay.is_position_reached():
-                current_position = delay.get_position()
-                actual_velocity = delay.motor.get_axis_parameter(delay.motor.AP.ActualVelocity)
-                logging.info(f"Current position: {current_position}, velocity: {actual_velocity}")
+            # Monitor the motor's position during movement, one pipelined read per step
+            status_aps = [delay.motor.AP.PositionReachedFlag, delay.motor.AP.ActualPosition, delay.motor.AP.ActualVelocity]
+            status = delay.read_many(0, status_aps)
+            while not status[delay.motor.AP.PositionReachedFlag]:
+                current_position = status[delay.motor.AP.ActualPosition]
+                actual_velocity = status[delay.motor.AP.ActualVelocity]
+                log_limited(logger, logging.INFO, 1.0, "Current position: %s, velocity: %s", current_position, actual_velocity)
                 time.sleep(0.2)
 
                 # Handle timeout
                 if time.time() - start_time > time_out:
-                    logging.warning("Timeout reached, stopping motor")
+                    logger.warning("Timeout reached, stopping motor")
                     delay.stop(axis=0)
                     break
+                status = delay.read_many(0, status_aps)
             else:
-                logging.info("Target position reached, stopping motor")
+                logger.info("Target position reached, stopping motor")
                 delay.stop(axis=0)
 
             # Wait before going back to home position
             time.sleep(3)
 
-            logging.info("Returning to home position")
+            logger.info("Returning to home position")
             delay.go_to_home_position()
 
     except Exception as e:
-        logging.error(f"An error occurred: {e}")
+        logger.error("An error occurred: %s", e)
         try:
             delay.stop(axis=0)  # Ensure the motor stops if an error occurs
-            logging.info("Motor stopped due to error.")
+            logger.info("Motor stopped due to error.")
             time.sleep(1)  # Allow some time for the motor to decelerate
         except Exception as stop_error:
-            logging.error(f"Failed to stop the motor gracefully: {stop_error}")
+            logger.error("Failed to stop the motor gracefully: %s", stop_error)
 
-    logging.info("rotate_delay procedure completed")
+    logger.info("rotate_delay procedure completed")
 
 if __name__ == "__main__":
+    # Write rotate_delay_log.txt from a background thread
+    configure_logging("rotate_delay_log.txt")
     main()
@@ -0,0 +1,139 @@
+import time
+
+import numpy as np
+
+from Motors import metrics
+from Motors.units import ScanPlan, compile_scan
+
+
+class ScanPoint:
+    """Record of one (delay_mm, angle_deg) raster point."""
+    __slots__ = ("index", "delay_mm", "angle_deg", "move_start", "settled", "acquired",
+                 "delay_readback_mm", "angle_readback_deg", "data")
+
+    def __init__(self, index, delay_mm, angle_deg):
+        self.index = index
+        self.delay_mm = delay_mm
+        self.angle_deg = angle_deg
+        self.move_start = None
+        self.settled = None
+        self.acquired = None
+        self.delay_readback_mm = None
+        self.angle_readback_deg = None
+        self.data = None
+
+    def __repr__(self):
+        return (f"ScanPoint({self.index}, delay={self.delay_mm} mm -> {self.delay_readback_mm}, "
+                f"angle={self.angle_deg} deg -> {self.angle_readback_deg})")
+
+
+class TwoAxisScan:
+    """
+    Raster scan over DelayLine (axis 0) and PolarizationPaddler (axis 1) on one TMCM3212.
+
+    `acquire(point)` is called once both axes have settled on `point`. It either
+    returns the measurement, or a callable finishing it. A callable marks the
+    rest of the acquisition (readout, processing) as insensitive to motion: the
+    engine starts the move to the next point first and calls it while the axes
+    travel. Only axes whose target changes are moved, and both move at once
+    when both change.
+
+    Targets are converted to microsteps for the whole scan up front (see
+    `compile`), so the loop only sends precomputed steps.
+    """
+    def __init__(self, delay, paddler, acquire, timeout=10):
+        self.delay = delay
+        self.paddler = paddler
+        self.acquire = acquire
+        self.timeout = timeout
+        self.controller = delay.module
+
+    def compile(self, delays, angles, delay_unit="mm", raster=True):
+        """ScanPlan for delays in `delay_unit` ("mm" or "ps") and angles in degrees."""
+        delay_converter = self.delay.ps if delay_unit == "ps" else self.delay.mm
+        return compile_scan(delay_converter, self.paddler.degrees, delays, angles, raster)
+
+    def run(self, points):
+        """Scan a ScanPlan, or `points` as (delay_mm, angle_deg) pairs, with moves overlapping readout."""
+        if not isinstance(points, ScanPlan):
+            delays, angles = np.asarray(points, dtype=np.float64).reshape(-1, 2).T
+            points = self.compile(delays, angles, raster=False)
+        delay_steps = points.delay_steps.tolist()
+        angle_steps = points.angle_steps.tolist()
+        delay_targets = self.delay.mm.from_steps(points.delay_steps).tolist()
+        angle_targets = self.paddler.degrees.from_steps(points.angle_steps).tolist()
+
+        records = []
+        previous = None
+        finish = None
+        for index, steps in enumerate(zip(delay_steps, angle_steps)):
+            with metrics.REGISTRY.span("scan.point"):
+                point = ScanPoint(index, delay_targets[index], angle_targets[index])
+                point.move_start = time.monotonic()
+                axes = self._start_move(previous, steps)
+
+                if finish is not None:
+                    records[-1].data = finish()
+                    finish = None
+
+                self._settle(point, axes, records[-1] if records else None)
+                result = self.acquire(point)
+                point.acquired = time.monotonic()
+                if callable(result):
+                    finish = result
+                else:
+                    point.data = result
+                records.append(point)
+                previous = steps
+
+        if finish is not None:
+            records[-1].data = finish()
+        return records
+
+    def run_serial(self, points, poll_interval=0.005):
+        """Naive reference loop: move, poll until reached, acquire, one step after the other."""
+        records = []
+        for index, (delay_mm, angle_deg) in enumerate(points):
+            with metrics.REGISTRY.span("scan.point"):
+                point = ScanPoint(index, delay_mm, angle_deg)
+                point.move_start = time.monotonic()
+                self.delay.move_to(0, delay_mm)
+                self.paddler.move_to(1, angle_deg)
+                start_time = time.monotonic()
+                while not (self.delay.is_position_reached() and self.paddler.is_position_reached()):
+                    if time.monotonic() - start_time > self.timeout:
+                        raise TimeoutError(f"Scan point {index} not reached within {self.timeout} s")
+                    time.sleep(poll_interval)
+                point.settled = time.monotonic()
+                point.delay_readback_mm = self._delay_mm(self.delay.get_position())
+                point.angle_readback_deg = self._angle_deg(self.paddler.get_position())
+                result = self.acquire(point)
+                point.data = result() if callable(result) else result
+                point.acquired = time.monotonic()
+                records.append(point)
+        return records
+
+    def _start_move(self, previous, steps):
+        axes = []
+        if previous is None or previous[0] != steps[0]:
+            self.delay.connection.move_to(0, steps[0], self.delay.module_id)
+            axes.append(0)
+        if previous is None or previous[1] != steps[1]:
+            self.paddler.connection.move_to(1, steps[1], self.paddler.module_id)
+            axes.append(1)
+        return axes
+
+    def _settle(self, point, axes, previous):
+        positions = self.controller.wait_axes_reached(axes, self.timeout) if axes else {}
+        if positions is None:
+            raise TimeoutError(f"Scan point {point.index} not reached within {self.timeout} s")
+        point.settled = time.monotonic()
+        # The axis that did not move keeps its previous readback
+        point.delay_readback_mm = self._delay_mm(positions[0]) if 0 in positions else previous.delay_readback_mm
+        point.angle_readback_deg = self._angle_deg(positions[1]) if 1 in positions else previous.angle_readback_deg
+
+    def _delay_mm(self, steps):
+        return float(self.delay.mm.from_steps(steps))
+
+    def _angle_deg(self, steps):
+        return float(self.paddler.degrees.from_steps(steps))
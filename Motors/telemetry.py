@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+
+SAMPLE_DTYPE = np.dtype([
+    ("timestamp", "f8"),
+    ("axis", "u1"),
+    ("position", "i4"),
+    ("velocity", "i4"),
+    ("load", "u4"),
+    ("flags", "u4"),
+])
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetryRecorder:
+    """
+    Records position, velocity, load and status flags of TMCM3212 axes into a
+    preallocated NumPy ring buffer of `capacity` samples.
+
+    A background thread reads all `axes` in one pipelined batch every 1/`rate_hz`
+    s. With a `spill_path`, every completed block of `block_size` samples is also
+    copied to a memory-mapped .npy file holding up to `spill_capacity` samples,
+    so long runs are kept on disk at constant memory. Unused rows of the spill
+    file have a zero timestamp; `load_spill` returns only the recorded part.
+
+    If a sample fails, the thread logs the exception, keeps it in `error` and
+    stops sampling.
+    """
+    def __init__(self, module, axes=(0,), rate_hz=100.0, capacity=65536, block_size=4096,
+                 spill_path=None, spill_capacity=None):
+        if capacity % block_size:
+            raise ValueError("capacity must be a multiple of block_size")
+        self.module = module
+        self.axes = tuple(axes)
+        self.rate_hz = rate_hz
+        self.block_size = block_size
+        self.buffer = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self.count = 0
+        self.spill = None
+        self.spill_count = 0
+        self.spill_overflow = False
+        if spill_path is not None:
+            if spill_capacity is None:
+                spill_capacity = 8 * 3600 * int(rate_hz) * len(self.axes)
+            self.spill = np.lib.format.open_memmap(spill_path, mode="w+", dtype=SAMPLE_DTYPE,
+                                                   shape=(spill_capacity,))
+        self._spilled = 0
+        self.error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        ap = module._MotorTypeA.AP
+        self._aps = [ap.ActualPosition, ap.ActualVelocity, ap.LoadValue, ap.StatusFlags]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exit_type, value, traceback):
+        self.stop()
+
+    def start(self):
+        self.error = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and write the samples of the last partial block to the spill file."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._spill_pending()
+        if self.spill is not None:
+            self.spill.flush()
+
+    def sample(self):
+        """Take one sample of every axis now."""
+        values = self.module.read_axes({axis: self._aps for axis in self.axes})
+        timestamp = time.monotonic()
+        position, velocity, load, flags = self._aps
+        capacity = len(self.buffer)
+        with self._lock:
+            for axis in self.axes:
+                self.buffer[self.count % capacity] = (timestamp, axis, values[(axis, position)],
+                                                      values[(axis, velocity)], values[(axis, load)],
+                                                      values[(axis, flags)])
+                self.count += 1
+                if self.count % self.block_size == 0:
+                    self._spill_pending()
+
+    def _run(self):
+        period = 1.0 / self.rate_hz
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                logger.exception("Telemetry sampling failed, recorder stopped")
+                self.error = e
+                self._stop.set()
+                break
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_time = time.monotonic()
+
+    def _spill_pending(self):
+        if self.spill is None or self._spilled == self.count:
+            return
+        capacity = len(self.buffer)
+        # Samples overwritten in the ring before they could be spilled are lost
+        start = max(self._spilled, self.count - capacity)
+        for chunk in self._ring_views(start, self.count):
+            room = len(self.spill) - self.spill_count
+            if len(chunk) > room:
+                chunk = chunk[:room]
+                self.spill_overflow = True
+            self.spill[self.spill_count:self.spill_count + len(chunk)] = chunk
+            self.spill_count += len(chunk)
+        self._spilled = self.count
+
+    def _ring_views(self, start, stop):
+        capacity = len(self.buffer)
+        first, last = start % capacity, stop % capacity
+        if stop - start <= 0:
+            return []
+        if first < last:
+            return [self.buffer[first:last]]
+        return [self.buffer[first:], self.buffer[:last]]
+
+    def views(self):
+        """
+        Zero-copy views of the samples still in the ring buffer, oldest first.
+
+        The views alias the ring, so copy them if the recorder keeps running.
+        """
+        with self._lock:
+            return self._ring_views(max(0, self.count - len(self.buffer)), self.count)
+
+    def latest(self):
+        """Copy of the samples in the ring buffer in chronological order."""
+        views = self.views()
+        return np.concatenate(views) if views else np.zeros(0, dtype=SAMPLE_DTYPE)
+
+    def spilled(self):
+        """Zero-copy view of the samples written to the spill file so far."""
+        return self.spill[:self.spill_count] if self.spill is not None else None
+
+    @staticmethod
+    def load_spill(path):
+        """Memory-map a spill file and return the recorded samples without loading them."""
+        data = np.load(path, mmap_mode="r")
+        unused = np.flatnonzero(data["timestamp"] == 0)
+        return data[:unused[0]] if len(unused) else data
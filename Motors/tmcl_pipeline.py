@@ -0,0 +1,158 @@
+import threading
+import time
+
+from pytrinamic.connections.tmcl_interface import TmclInterface
+from pytrinamic.helpers import to_signed_32
+from pytrinamic.tmcl import TMCLCommand, TMCLReply, TMCLRequest, TMCLReplyStatusError
+
+
+class PipelineError(RuntimeError):
+    """Raised when a reply cannot be matched to the request it should answer."""
+
+
+def ap_frame(index, axis, index_bit_width=8):
+    """Encode an axis parameter `index` and `axis` into the TMCL (type, motor) bytes."""
+    axis_bit_width = 16 - index_bit_width
+    if index >= 2**index_bit_width:
+        raise ValueError(f"Value {index} for parameter index is outside the allowed range (0..{2**index_bit_width - 1})!")
+    if axis >= 2**axis_bit_width:
+        raise ValueError(f"Value {axis} for parameter axis is outside the allowed range (0..{2**axis_bit_width - 1})!")
+    index_shift = 8 - axis_bit_width
+    index_mask = ((2**index_bit_width) - 1) << 8
+    return index & 0xFF, axis | ((index & index_mask) >> index_shift)
+
+
+_lock_guard = threading.Lock()
+
+
+def connection_lock(connection):
+    """
+    The one lock every TMCL frame on `connection` goes through.
+
+    It is created on first use and wraps the connection's `send_request`, so
+    pytrinamic's own calls (move_to, get_axis_parameter, ...) take it as well
+    and cannot interleave with a pipelined batch from another thread.
+    """
+    with _lock_guard:
+        lock = getattr(connection, "_tmcl_lock", None)
+        if lock is None:
+            lock = threading.RLock()
+            send_request = getattr(connection, "send_request", None)
+            if send_request is not None:
+                def locked_send_request(request, **kwargs):
+                    with lock:
+                        return send_request(request, **kwargs)
+                connection.send_request = locked_send_request
+            connection._tmcl_lock = lock
+        return lock
+
+
+class PipelinedTransport:
+    """
+    Sends a window of TMCL frames before collecting the replies.
+
+    TMCL modules answer requests strictly in the order they were received, so a
+    window of requests can be on the wire at once and the replies are matched
+    back by position, command and module address. Connections that do not
+    expose the raw `_send`/`_recv` pair fall back to one round trip per frame.
+    On a half-duplex RS485 bus the module may answer while the host is still
+    transmitting, so use `window=1` there.
+
+    `lock` is the connection's lock (see `connection_lock`), shared by every
+    transport and every direct call on the same connection.
+    """
+    def __init__(self, connection, window=16):
+        self.connection = connection
+        self.window = window
+        self.lock = connection_lock(connection)
+
+    @property
+    def pipelined(self):
+        return isinstance(self.connection, TmclInterface)
+
+    @property
+    def unacknowledged(self):
+        """Whether frames can be sent without reading their replies (see `send_unacknowledged`)."""
+        return self.pipelined and not getattr(self.connection, "ACKNOWLEDGED_ONLY", False)
+
+    def request_many(self, requests):
+        """
+        Send `requests`, a list of (module_id, command, type, motor, value) tuples,
+        and return the list of TMCLReply objects in the same order.
+        """
+        replies = []
+        with self.lock:
+            if not self.pipelined:
+                return [self.connection.send(command, command_type, motor, value, module_id)
+                        for module_id, command, command_type, motor, value in requests]
+            for start in range(0, len(requests), self.window):
+                replies.extend(self._exchange(requests[start:start + self.window]))
+        return replies
+
+    def _exchange(self, requests):
+        connection = self.connection
+        host_id = connection._host_id
+        frames = [TMCLRequest(module_id, command, command_type, motor, value)
+                  for module_id, command, command_type, motor, value in requests]
+
+        for frame in frames:
+            connection.logger.debug("Tx: %s", frame.oneline_str_repr())
+            connection._send(host_id, frame.moduleAddress, frame.to_buffer())
+
+        # Always drain every reply of the window so the stream stays in sync,
+        # then report the first problem.
+        replies = []
+        error = None
+        for frame in frames:
+            try:
+                reply = TMCLReply.from_buffer(connection._recv(host_id, frame.moduleAddress))
+            except Exception as e:
+                raise PipelineError(f"Lost reply for {frame.oneline_str_repr()}") from e
+            connection.logger.debug("Rx: %s", reply.oneline_str_repr())
+            if error is None:
+                try:
+                    connection._reply_check(reply)
+                    if reply.command != frame.command or reply.module_address != frame.moduleAddress:
+                        raise PipelineError(f"Reply {reply} does not match {frame}")
+                    if reply.status < 100 and frame.command != TMCLCommand.READ_TMCL_MEMORY:
+                        raise TMCLReplyStatusError(reply)
+                except Exception as e:
+                    error = e
+            replies.append(reply)
+
+        if error is not None:
+            raise error
+        return replies
+
+    def send_unacknowledged(self, requests, spacing=0.0):
+        """
+        Send `requests` as (module_id, command, type, motor, value) tuples without
+        reading replies, `spacing` s apart. Only for modules with replies
+        suppressed. Raises RuntimeError on connections that cannot send a frame
+        without waiting for its reply (no raw access, or a broker in between).
+        """
+        if not self.unacknowledged:
+            raise RuntimeError(f"{type(self.connection).__name__} cannot send frames without reading replies")
+        connection = self.connection
+        with self.lock:
+            for module_id, command, command_type, motor, value in requests:
+                data = TMCLRequest(module_id, command, command_type, motor, value).to_buffer()
+                connection._send(connection._host_id, module_id, data)
+                if spacing:
+                    time.sleep(spacing)
+
+    def get_axis_parameters(self, module_id, items, index_bit_width=8, signed=()):
+        """
+        Read the axis parameters listed in `items` as (axis, index) pairs.
+
+        Returns a dict mapping each (axis, index) pair to its value. Indices in
+        `signed` are decoded as signed 32 bit integers.
+        """
+        requests = []
+        for axis, index in items:
+            command_type, motor = ap_frame(index, axis, index_bit_width)
+            requests.append((module_id, TMCLCommand.GAP, command_type, motor, 0))
+        values = {}
+        for (axis, index), reply in zip(items, self.request_many(requests)):
+            values[(axis, index)] = to_signed_32(reply.value) if index in signed else reply.value
+        return values
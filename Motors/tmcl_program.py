@@ -0,0 +1,220 @@
+import contextlib
+import time
+
+from pytrinamic.tmcl import TMCLCommand
+
+from Motors.tmcl_pipeline import ap_frame
+
+
+class Label:
+    """Jump target in a TmclProgram, bound to an address by TmclProgram.place."""
+    __slots__ = ("address",)
+
+    def __init__(self):
+        self.address = None
+
+
+class TmclProgram:
+    """
+    Builder for a TMCL standalone program that runs on the module.
+
+    Instructions are appended in order. Jumps refer to Labels that are
+    resolved by `compile`, and `loop(count)` repeats its body with a counter
+    in a user variable (SGP + DJNZ). Waits are in TMCL ticks of 10 ms.
+
+        program = TmclProgram()
+        with program.loop(10):
+            program.move_to(0, 20000)
+            program.wait_position_reached(0)
+            program.set_output(0, 1)
+            program.wait_ticks(1)
+            program.set_output(0, 0)
+        program.stop()
+    """
+    # User variables (GP bank 2) used as loop counters, one per nesting level
+    LOOP_VARIABLE_BASE = 240
+    MAX_LOOP_DEPTH = 8
+    # TMCL program memory of the TMCM-3212 in instructions
+    MEMORY_SIZE = 2048
+
+    class WAIT:
+        TICKS = 0
+        POSITION_REACHED = 1
+        REFERENCE_SWITCH = 2
+        LIMIT_SWITCH = 3
+        REFERENCE_SEARCH_DONE = 4
+
+    def __init__(self, ap_index_bit_width=8):
+        self.ap_index_bit_width = ap_index_bit_width
+        self.instructions = []
+        self._loop_depth = 0
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def label(self):
+        return Label()
+
+    def place(self, label):
+        """Bind `label` to the address of the next instruction."""
+        label.address = len(self.instructions)
+        return label
+
+    def _append(self, command, command_type=0, motor=0, value=0):
+        self.instructions.append((command, command_type, motor, value))
+
+    # Motion
+    def move_to(self, axis, position):
+        self._append(TMCLCommand.MVP, 0, axis, int(position))
+
+    def move_by(self, axis, difference):
+        self._append(TMCLCommand.MVP, 1, axis, int(difference))
+
+    def rotate(self, axis, velocity):
+        self._append(TMCLCommand.ROR, 0, axis, int(velocity))
+
+    def stop_motor(self, axis):
+        self._append(TMCLCommand.MST, 0, axis, 0)
+
+    def reference_search(self, axis):
+        self._append(TMCLCommand.RFS, 0, axis, 0)
+
+    def set_axis_parameter(self, ap, axis, value):
+        command_type, motor = ap_frame(ap, axis, self.ap_index_bit_width)
+        self._append(TMCLCommand.SAP, command_type, motor, int(value))
+
+    def set_global_parameter(self, gp, bank, value):
+        self._append(TMCLCommand.SGP, gp, bank, int(value))
+
+    # IO
+    def set_output(self, port, value, bank=2):
+        self._append(TMCLCommand.SIO, port, bank, int(value))
+
+    # Waits, `timeout` in ticks with 0 waiting forever
+    def wait_ticks(self, ticks):
+        self._append(TMCLCommand.WAIT, self.WAIT.TICKS, 0, int(ticks))
+
+    def wait_position_reached(self, axis, timeout=0):
+        self._append(TMCLCommand.WAIT, self.WAIT.POSITION_REACHED, axis, int(timeout))
+
+    def wait_reference_search(self, axis, timeout=0):
+        self._append(TMCLCommand.WAIT, self.WAIT.REFERENCE_SEARCH_DONE, axis, int(timeout))
+
+    # Control flow
+    def jump(self, label):
+        self._append(TMCLCommand.JA, 0, 0, label)
+
+    def stop(self):
+        self._append(TMCLCommand.STOP)
+
+    @contextlib.contextmanager
+    def loop(self, count):
+        """Repeat the instructions added inside the block `count` times."""
+        if self._loop_depth >= self.MAX_LOOP_DEPTH:
+            raise ValueError(f"Loops can be nested at most {self.MAX_LOOP_DEPTH} deep")
+        if count < 1:
+            raise ValueError(f"Loop count {count} must be at least 1")
+        variable = self.LOOP_VARIABLE_BASE + self._loop_depth
+        self.set_global_parameter(variable, 2, count)
+        start = self.place(self.label())
+        self._loop_depth += 1
+        try:
+            yield
+        finally:
+            self._loop_depth -= 1
+        self._append(TMCLCommand.DJNZ, variable, 0, start)
+
+    def compile(self, address=0):
+        """
+        Return the program as (command, type, motor, value) instructions for
+        download at `address`, with every Label replaced by its address.
+        """
+        if address + len(self.instructions) > self.MEMORY_SIZE:
+            raise ValueError(f"Program of {len(self.instructions)} instructions does not fit at address {address}")
+        code = []
+        for command, command_type, motor, value in self.instructions:
+            if isinstance(value, Label):
+                if value.address is None:
+                    raise ValueError("Jump to a label that was never placed")
+                value = value.address + address
+            code.append((command, command_type, motor, value))
+        return code
+
+
+def scan_program(axis, targets, dwell_ticks=0, trigger_output=None, repeat=1, ap_index_bit_width=8):
+    """
+    TmclProgram visiting `targets` (microsteps) on `axis` in order, `repeat`
+    times. At each target it waits for the position, pulses `trigger_output`
+    high for the dwell (if given) and waits `dwell_ticks`.
+    """
+    program = TmclProgram(ap_index_bit_width)
+    with program.loop(repeat):
+        for target in targets:
+            program.move_to(axis, target)
+            program.wait_position_reached(axis)
+            if trigger_output is not None:
+                program.set_output(trigger_output, 1)
+            if dwell_ticks:
+                program.wait_ticks(dwell_ticks)
+            if trigger_output is not None:
+                program.set_output(trigger_output, 0)
+    program.stop()
+    return program
+
+
+class ProgramRunner:
+    """Downloads, starts, stops and monitors TMCL standalone programs on a TMCM3212."""
+    class STATUS:
+        STOPPED = 0
+        RUNNING = 1
+        STEPPING = 2
+        RESET = 3
+
+    def __init__(self, module):
+        self.module = module
+
+    def _request(self, frames):
+        module_id = self.module.module_id
+        return self.module.transport.request_many([(module_id,) + frame for frame in frames])
+
+    def download(self, program, address=0):
+        """Store `program` in the module's TMCL memory at `address`, in one pipelined batch."""
+        code = program.compile(address)
+        self._request([(TMCLCommand.START_DOWNLOAD_MODE, 0, 0, address)] + code +
+                      [(TMCLCommand.QUIT_DOWNLOAD_MODE, 0, 0, 0)])
+        return len(code)
+
+    def run(self, address=None):
+        """Start the program at `address`, or continue from the current program counter."""
+        if address is None:
+            self._request([(TMCLCommand.RUN_APPLICATION, 0, 0, 0)])
+        else:
+            self._request([(TMCLCommand.RUN_APPLICATION, 1, 0, address)])
+
+    def stop(self):
+        self._request([(TMCLCommand.STOP_APPLICATION, 0, 0, 0)])
+
+    def status(self):
+        """(ApplicationStatus, ProgramCounter) in one batch."""
+        gp = self.module.GP0
+        replies = self._request([(TMCLCommand.GGP, gp.ApplicationStatus, 0, 0),
+                                 (TMCLCommand.GGP, gp.ProgramCounter, 0, 0)])
+        return replies[0].value, replies[1].value
+
+    def wait(self, timeout=None, poll_interval=0.05, on_progress=None):
+        """
+        Wait for the program to stop, calling `on_progress(program_counter)` on
+        every poll. Returns the final program counter, or None after stopping
+        the program on timeout.
+        """
+        start_time = time.monotonic()
+        while True:
+            status, program_counter = self.status()
+            if on_progress is not None:
+                on_progress(program_counter)
+            if status != self.STATUS.RUNNING:
+                return program_counter
+            if timeout is not None and time.monotonic() - start_time > timeout:
+                self.stop()
+                return None
+            time.sleep(poll_interval)
@@ -11,18 +11,66 @@ from pytrinamic.features import MotorControlModule, DriveSettingModule, LinearRa
 from pytrinamic.features import StallGuard2Module, CoolStepModule
 from  .Stepper_motor import Steppermotor
 from pytrinamic.modules import TMCLModule
-from pytrinamic.tmcl import TMCLCommand
+from pytrinamic.tmcl import TMCLCommand, TMCLReplyStatusError
+from pytrinamic.helpers import to_signed_32
+from .tmcl_pipeline import PipelinedTransport, ap_frame
+from .parameter_cache import AxisParameterCache
+from .profiles import get_profile, profile_hash
+from .motion_model import LinearRampModel
+from .closed_loop import ClosedLoopModule
+from .bulk_write import BulkWrite
+from .tmcl_program import TmclProgram
+import contextlib
+import functools
+import logging
+import math
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
 
 class TMCM3212(Steppermotor, TMCLModule):
     """
     The TMCM-3212 is a three axis stepper motor controller/driver module for sensorless load dependent current control.
     """
+    # Keyed by connection id: a live module holds its connection, so the id stays unique
+    _shared = weakref.WeakValueDictionary()
+    _shared_lock = threading.Lock()
+
     def __init__(self, connection, module_id=1,ap_index_bit_width=8):
         self.connection = connection
         self.module_id = module_id
         self.ap_index_bit_width = ap_index_bit_width
         self.name='TMCM3212'
         self.motors = [self._MotorTypeA(self, 0), self._MotorTypeA(self, 1), self._MotorTypeA(self, 2)]
+        self.transport = PipelinedTransport(connection)
+
+    @staticmethod
+    def shared(connection, module_id=1, ap_index_bit_width=8):
+        """
+        Return the one TMCM3212 used by every axis wrapper of module `module_id`
+        on `connection`. It is kept as long as something refers to it.
+        """
+        with TMCM3212._shared_lock:
+            module = TMCM3212._shared.get((id(connection), module_id))
+            if module is None:
+                module = TMCM3212._shared[(id(connection), module_id)] = TMCM3212(connection, module_id,
+                                                                                  ap_index_bit_width)
+            return module
+
+    def _use_shared(self, connection, module_id=1, ap_index_bit_width=8):
+        """
+        Set up an axis wrapper on the shared module instead of building its own
+        axes: the wrapper then acts on the same motors, transport and caches.
+        """
+        self.module = TMCM3212.shared(connection, module_id, ap_index_bit_width)
+        self.connection = connection
+        self.module_id = module_id
+        self.ap_index_bit_width = ap_index_bit_width
+        self.name = self.module.name
+        self.motors = self.module.motors
+        self.transport = self.module.transport
 
     def rotate(self, axis,velocity):
         self.connection.rotate(axis, velocity, self.module_id)
@@ -34,7 +82,8 @@ class TMCM3212(Steppermotor, TMCLModule):
 
     def move_by(self, axis, difference, velocity=None):
         if velocity:
-            self.move_by(axis, difference, velocity)
+            self.motors[axis].linear_ramp.max_velocity = velocity
+        self.connection.move_by(axis, difference, self.module_id)
 
     def stop(self, axis):
         self.connection.stop(axis, self.module_id)
@@ -72,6 +121,360 @@ class TMCM3212(Steppermotor, TMCLModule):
         """Get the status, whether reference search is active."""
         return self.connection.reference_search(2, motor)
     
+    def set_axis_parameter(self, ap_type, axis, value):
+        cache = self.motors[axis].cache
+        if cache is not None and not cache.should_write(ap_type, value):
+            return
+        TMCLModule.set_axis_parameter(self, ap_type, axis, value)
+        if cache is not None:
+            cache.written(ap_type, value)
+
+    def get_axis_parameter(self, ap_type, axis, signed=False):
+        cache = self.motors[axis].cache
+        if cache is None:
+            return TMCLModule.get_axis_parameter(self, ap_type, axis, signed)
+        value = cache.get(ap_type)
+        if value is None:
+            value = TMCLModule.get_axis_parameter(self, ap_type, axis, signed)
+            cache.update(ap_type, value)
+        return to_signed_32(value) if signed else value & 0xFFFFFFFF
+
+    def store_axis_parameter(self, ap_type, axis):
+        TMCLModule.store_axis_parameter(self, ap_type, axis)
+        if self.motors[axis].cache is not None:
+            self.motors[axis].cache.stored(ap_type)
+
+    def restore_axis_parameter(self, ap_type, axis):
+        if self.motors[axis].cache is not None:
+            self.motors[axis].cache.invalidate(ap_type)
+        return TMCLModule.restore_axis_parameter(self, ap_type, axis)
+
+    def enable_cache(self, axes=None):
+        """Serve host-owned parameters of `axes` (all axes by default) from memory."""
+        for axis in range(len(self.motors)) if axes is None else axes:
+            self.motors[axis].enable_cache()
+
+    def cache_stats(self):
+        """Cache counters per axis, None for axes without a cache."""
+        return {axis: motor.cache.stats() if motor.cache is not None else None
+                for axis, motor in enumerate(self.motors)}
+
+    def ramp_model(self, axis):
+        """Linear ramp model of `axis` built from its current ramp parameters."""
+        ap = self._MotorTypeA.AP
+        values = self.read_many(axis, [ap.MaxVelocity, ap.MaxAcceleration, ap.StartVelocity, ap.StopVelocity])
+        return LinearRampModel.from_parameters(values, ap)
+
+    def predict_move_time(self, axis, target=None):
+        """
+        Predicted time in s until `axis` arrives at `target`, by default the
+        TargetPosition of the move in progress.
+        """
+        ap = self._MotorTypeA.AP
+        values = self.read_many(axis, [ap.TargetPosition, ap.ActualPosition, ap.ActualVelocity,
+                                       ap.MaxVelocity, ap.MaxAcceleration, ap.StartVelocity, ap.StopVelocity])
+        return self._remaining_time(values, target)
+
+    def _remaining_time(self, values, target=None):
+        ap = self._MotorTypeA.AP
+        if target is None:
+            target = values[ap.TargetPosition]
+        distance = target - values[ap.ActualPosition]
+        velocity = values[ap.ActualVelocity]
+        # Velocity component towards the target
+        toward = velocity if distance >= 0 else -velocity
+        return LinearRampModel.from_parameters(values, ap).move_time(distance, toward)
+
+    def move_planned(self, axis, position, planner, wait=False, timeout=None):
+        """
+        Move `axis` to `position` with the ramp chosen by `planner` (a
+        RampPlanner), writing only the ramp parameters that change.
+
+        Returns {"written": {ap: value}, "predicted": s, "measured": s}, with the
+        measured time only when waiting for the arrival (`wait`).
+        """
+        ap = self._MotorTypeA.AP
+        current = self.read_many(axis, [ap.ActualPosition, ap.MaxVelocity, ap.MaxAcceleration,
+                                        ap.StartVelocity, ap.StopVelocity])
+        distance = position - current.pop(ap.ActualPosition)
+        changes, model = planner.plan(distance, current, ap)
+        written = self.write_many(axis, changes)
+        return self.timed_move(axis, position, written, model.move_time(distance), wait, timeout)
+
+    def timed_move(self, axis, position, written=None, predicted=None, wait=False, timeout=None):
+        """
+        Start the move of `axis` to `position` and return the result in the shape
+        of `move_planned`, with `written` and `predicted` passed through.
+        """
+        start_time = time.monotonic()
+        self.connection.move_to(axis, position, self.module_id)
+        result = {"written": {} if written is None else written, "predicted": predicted, "measured": None}
+        if wait and self.wait_until_reached(axis, timeout):
+            # Simulated modules may run in accelerated time
+            result["measured"] = (time.monotonic() - start_time) * getattr(self.connection, "time_scale", 1.0)
+        return result
+
+    def wait_position_reached(self, axis, timeout=None, poll_interval=0.005):
+        """
+        Block until `axis` reaches its target position, using the module's WAIT
+        command: one request whose reply arrives as soon as the firmware sees
+        the event. The connection lock is held until then, so telemetry and
+        other threads on the connection pause for the whole wait; set
+        WAIT_SLICE to split it into WAITs of at most that many s, with the bus
+        free in between. Falls back to polling PositionReachedFlag every
+        `poll_interval` s where WAIT is not available. Returns False after
+        `timeout` s.
+        """
+        flag = self._MotorTypeA.AP.PositionReachedFlag
+        return self._wait_event(axis, TmclProgram.WAIT.POSITION_REACHED, timeout, poll_interval,
+                                lambda: self.read_many(axis, [flag])[flag] == 1)
+
+    def wait_reference_search(self, axis, timeout=None, poll_interval=0.005):
+        """
+        Block until the reference search of `axis` has finished, using WAIT like
+        `wait_position_reached`. Returns False after `timeout` s.
+        """
+        return self._wait_event(axis, TmclProgram.WAIT.REFERENCE_SEARCH_DONE, timeout, poll_interval,
+                                lambda: self.transport.request_many([(self.module_id, TMCLCommand.RFS, 2, axis,
+                                                                      0)])[0].value == 0)
+
+    def _wait_event(self, axis, wait_type, timeout, poll_interval, done):
+        start_time = time.monotonic()
+        if self._wait_supported is not False:
+            # Simulated modules may run in accelerated time
+            scale = getattr(self.connection, "time_scale", 1.0)
+            try:
+                while True:
+                    remaining = None if timeout is None else timeout - (time.monotonic() - start_time)
+                    if remaining is not None and remaining <= 0:
+                        return done()
+                    wait_time = remaining
+                    if self.WAIT_SLICE is not None:
+                        wait_time = self.WAIT_SLICE if remaining is None else min(remaining, self.WAIT_SLICE)
+                    # Zero ticks wait for the event without a timeout
+                    ticks = 0 if wait_time is None else max(1, math.ceil(wait_time * scale / self.WAIT_TICK))
+                    wait_start = time.monotonic()
+                    with self._reply_timeout(wait_time):
+                        self.transport.request_many([(self.module_id, TMCLCommand.WAIT, wait_type, axis, ticks)])
+                    self._wait_supported = True
+                    # A WAIT ending before its ticks have passed ended with the event
+                    if wait_time is None or time.monotonic() - wait_start < wait_time:
+                        return True
+            except TMCLReplyStatusError:
+                self._wait_supported = False
+        while not done():
+            if timeout is not None and time.monotonic() - start_time > timeout:
+                return False
+            time.sleep(poll_interval)
+        return True
+
+    @contextlib.contextmanager
+    def _reply_timeout(self, timeout):
+        """Let a serial connection wait `timeout` s (plus a margin, None for ever) for the next reply."""
+        if not hasattr(self.connection, "set_timeout"):
+            yield
+            return
+        previous = self.connection.get_timeout()
+        self.connection.set_timeout(0 if timeout is None else timeout + 1.0)
+        try:
+            yield
+        finally:
+            self.connection.set_timeout(previous or 0)
+
+    def wait_until_reached(self, axis, timeout=None, margin=0.02, poll_interval=0.005):
+        """
+        Wait for the move in progress on `axis` to finish.
+
+        Sleeps until `margin` s before the arrival predicted by the ramp model,
+        then polls PositionReachedFlag every `poll_interval` s. On timeout the
+        axis is stopped and False is returned.
+        """
+        return self.wait_axes_reached([axis], timeout, margin, poll_interval) is not None
+
+    def wait_axes_reached(self, axes, timeout=None, margin=0.02, poll_interval=0.005):
+        """
+        Wait for the moves in progress on all of `axes` to finish, with one
+        combined status read per poll.
+
+        Returns {axis: ActualPosition} read back at arrival, or None after
+        stopping all of `axes` on timeout.
+        """
+        ap = self._MotorTypeA.AP
+        start_time = time.monotonic()
+        values = self.read_axes({axis: [ap.PositionReachedFlag, ap.TargetPosition, ap.ActualPosition,
+                                        ap.ActualVelocity, ap.MaxVelocity, ap.MaxAcceleration,
+                                        ap.StartVelocity, ap.StopVelocity] for axis in axes})
+        pending = [axis for axis in axes if not values[(axis, ap.PositionReachedFlag)]]
+        if pending:
+            # Simulated modules may run in accelerated time
+            eta = max(self._remaining_time({index: value for (a, index), value in values.items() if a == axis})
+                      for axis in pending)
+            eta = eta / getattr(self.connection, "time_scale", 1.0) - margin
+            if timeout is not None:
+                eta = min(eta, timeout)
+            if eta > 0:
+                time.sleep(eta)
+        while pending:
+            values.update(self.read_axes({axis: [ap.PositionReachedFlag, ap.ActualPosition] for axis in pending}))
+            pending = [axis for axis in pending if not values[(axis, ap.PositionReachedFlag)]]
+            if not pending:
+                break
+            if timeout is not None and time.monotonic() - start_time > timeout:
+                for axis in axes:
+                    self.stop(axis)
+                return None
+            time.sleep(poll_interval)
+        return {axis: values[(axis, ap.ActualPosition)] for axis in axes}
+
+    def read_many(self, axis, aps):
+        """Read the axis parameters `aps` of `axis` in one pipelined batch, returned as {ap: value}."""
+        values = self.read_axes({axis: aps})
+        return {ap: values[(axis, ap)] for ap in aps}
+
+    def read_axes(self, aps_by_axis):
+        """Read {axis: [ap, ...]} in one pipelined batch, returned as {(axis, ap): value}."""
+        values = {}
+        items = []
+        for axis, aps in aps_by_axis.items():
+            cache = self.motors[axis].cache
+            for ap in aps:
+                value = cache.get(ap) if cache is not None else None
+                if value is None:
+                    items.append((axis, ap))
+                else:
+                    values[(axis, ap)] = to_signed_32(value) if ap in self._MotorTypeA.SIGNED_AP else value & 0xFFFFFFFF
+        if items:
+            read = self.transport.get_axis_parameters(self.module_id, items, self.ap_index_bit_width,
+                                                      self._MotorTypeA.SIGNED_AP)
+            for (axis, ap), value in read.items():
+                if self.motors[axis].cache is not None:
+                    self.motors[axis].cache.update(ap, value)
+            values.update(read)
+        return values
+
+    def snapshot(self, axes=None, aps=None):
+        """
+        Read the telemetry of `axes` (all axes by default) in one pipelined batch.
+
+        Returns {axis: {ap_name: value}} for the parameter names in `aps`
+        (default `_MotorTypeA.SNAPSHOT_AP`).
+        """
+        if axes is None:
+            axes = range(len(self.motors))
+        if aps is None:
+            aps = self._MotorTypeA.SNAPSHOT_AP
+        indices = [getattr(self._MotorTypeA.AP, name) for name in aps]
+        values = self.read_axes({axis: indices for axis in axes})
+        return {axis: {name: values[(axis, index)] for name, index in zip(aps, indices)} for axis in axes}
+
+    def write_many(self, axis, values):
+        """Write {ap: value} to `axis` in one pipelined batch, skipping values the cache already holds."""
+        cache = self.motors[axis].cache
+        if cache is not None:
+            values = {ap: value for ap, value in values.items() if cache.should_write(ap, value)}
+        requests = []
+        for ap, value in values.items():
+            command_type, motor = ap_frame(ap, axis, self.ap_index_bit_width)
+            requests.append((self.module_id, TMCLCommand.SAP, command_type, motor, value))
+        self.transport.request_many(requests)
+        if cache is not None:
+            for ap, value in values.items():
+                cache.written(ap, value)
+        return values
+
+    def write_changed(self, axis, values):
+        """
+        Write the {ap: value} that differ from the current values of `axis`, read
+        in one batch (or from the cache). Returns the values written.
+        """
+        current = self.read_many(axis, list(values))
+        return self.write_many(axis, {ap: value for ap, value in values.items() if current[ap] != value})
+
+    def bulk_write(self, verify=True, spacing=None):
+        """
+        Context manager collecting axis parameter writes and sending them with
+        module replies turned off, see BulkWrite.
+        """
+        return BulkWrite(self, verify, spacing)
+
+    def store_many(self, axis, aps):
+        """Store the RAM values of `aps` of `axis` to the EEPROM (STAP) in one pipelined batch."""
+        requests = []
+        for ap in aps:
+            command_type, motor = ap_frame(ap, axis, self.ap_index_bit_width)
+            requests.append((self.module_id, TMCLCommand.STAP, command_type, motor, 0))
+        self.transport.request_many(requests)
+        if self.motors[axis].cache is not None:
+            for ap in aps:
+                self.motors[axis].cache.stored(ap)
+
+    def apply_profile(self, axis, profile, store=False, verify=True, profiles=None):
+        """
+        Bring `axis` to the configuration `profile` (a name from `profiles.PROFILES`
+        or a {AP name: value} dict) with as few writes as possible.
+
+        The current values and the hash stored in user variable
+        PROFILE_HASH_VARIABLE + axis are read back in one batch and only the
+        parameters that differ are written. With `store` the profile and its hash
+        are saved to the EEPROM, so the next start finds nothing to write; the
+        hash is restored from the EEPROM and read back, and "stored" is False
+        when it did not persist. With `verify=False` a matching stored hash
+        skips the readback completely.
+
+        Returns a dict with the written AP names, whether the profile was stored
+        and whether the stored hash already matched.
+        """
+        profile = get_profile(profile, profiles)
+        expected = {getattr(self._MotorTypeA.AP, name): int(value) for name, value in profile.items()}
+        digest = profile_hash(profile)
+        hash_variable = self.PROFILE_HASH_VARIABLE + axis
+        hash_request = (self.module_id, TMCLCommand.GGP, hash_variable, 2, 0)
+
+        if not verify:
+            stored_hash = self.transport.request_many([hash_request])[0].value
+            if stored_hash == digest:
+                return {"written": [], "stored": False, "hash_matched": True}
+
+        requests = [hash_request]
+        for ap in expected:
+            command_type, motor = ap_frame(ap, axis, self.ap_index_bit_width)
+            requests.append((self.module_id, TMCLCommand.GAP, command_type, motor, 0))
+        replies = self.transport.request_many(requests)
+        stored_hash = replies[0].value
+        current = {ap: to_signed_32(reply.value) for ap, reply in zip(expected, replies[1:])}
+
+        diff = {ap: value for ap, value in expected.items() if to_signed_32(value) != current[ap]}
+        if self.motors[axis].cache is not None:
+            for ap, value in current.items():
+                self.motors[axis].cache.update(ap, value)
+        self.write_many(axis, diff)
+
+        stored = False
+        if store and (diff or stored_hash != digest):
+            self.store_many(axis, list(expected))
+            # Restore the hash from the EEPROM and read it back, to know it survives a reset
+            replies = self.transport.request_many([(self.module_id, TMCLCommand.SGP, hash_variable, 2, digest),
+                                                   (self.module_id, TMCLCommand.STGP, hash_variable, 2, 0),
+                                                   (self.module_id, TMCLCommand.RSGP, hash_variable, 2, 0),
+                                                   (self.module_id, TMCLCommand.GGP, hash_variable, 2, 0)])
+            stored = replies[-1].value == digest
+            if not stored:
+                logger.warning("User variable %d did not keep the profile hash in the EEPROM, the profile of "
+                               "axis %d will be verified at every start", hash_variable, axis)
+
+        names = {value: name for name, value in vars(self._MotorTypeA.AP).items() if not name.startswith("_")}
+        return {"written": [names[ap] for ap in diff], "stored": stored, "hash_matched": stored_hash == digest}
+
+    def is_referenced(self, axis):
+        """Whether the position counter of `axis` is still zeroed at its home switch from an earlier homing."""
+        variable = self.HOME_REFERENCE_VARIABLE + axis
+        return self.transport.request_many([(self.module_id, TMCLCommand.GGP, variable, 2, 0)])[0].value == 1
+
+    def set_referenced(self, axis, referenced=True):
+        """Mark the position counter of `axis` as zeroed at its home switch, or clear the mark."""
+        variable = self.HOME_REFERENCE_VARIABLE + axis
+        self.transport.request_many([(self.module_id, TMCLCommand.SGP, variable, 2, int(referenced))])
+
     # IO pin functions
     def get_analog_input(self, x):
             return self.connection.get_analog_input(x)
@@ -82,10 +485,37 @@ class TMCM3212(Steppermotor, TMCLModule):
 
         def __init__(self, module, axis):
             MotorControlModule.__init__(self, module, axis, self.AP)
-            self.drive_settings = DriveSettingModule(module, axis, self.AP)
-            self.linear_ramp = LinearRampModule(module, axis, self.AP)
-            self.stallguard2 = StallGuard2Module(module, axis, self.AP)
-            self.coolstep = CoolStepModule(module, axis, self.AP, self.stallguard2)
+            self.cache = None
+
+        # Feature modules are built on first use, most axes only ever need one or two
+        @functools.cached_property
+        def drive_settings(self):
+            return DriveSettingModule(self._parent, self._axis, self.AP)
+
+        @functools.cached_property
+        def linear_ramp(self):
+            return LinearRampModule(self._parent, self._axis, self.AP)
+
+        @functools.cached_property
+        def stallguard2(self):
+            return StallGuard2Module(self._parent, self._axis, self.AP)
+
+        @functools.cached_property
+        def coolstep(self):
+            return CoolStepModule(self._parent, self._axis, self.AP, self.stallguard2)
+
+        @functools.cached_property
+        def closed_loop(self):
+            return ClosedLoopModule(self._parent, self._axis, self.AP)
+
+        def enable_cache(self):
+            """Keep host-owned parameters (STATIC_AP) of this axis in a write-through cache."""
+            if self.cache is None:
+                self.cache = AxisParameterCache(self.STATIC_AP)
+            return self.cache
+
+        def disable_cache(self):
+            self.cache = None
 
         def get_position_reached(self):
             return self.get_axis_parameter(self.AP.PositionReachedFlag)
@@ -99,8 +529,11 @@ class TMCM3212(Steppermotor, TMCLModule):
 
         def set_reference_switch_speed(self, speed):
             return self.set_axis_parameter(self.AP.RefSwitchSpeed, speed)
-        
-        
+
+        # Parameters read by TMCM3212.snapshot() unless told otherwise
+        SNAPSHOT_AP = ("ActualPosition", "ActualVelocity", "PositionReachedFlag",
+                       "HomeSwitch", "StatusFlags", "LoadValue")
+
 
         class AP:
             TargetPosition                 = 0
@@ -214,6 +647,29 @@ class TMCM3212(Steppermotor, TMCLModule):
             GroupIndex                     = 249
             ReverseShaft                   = 251
 
+        # Parameters holding signed 32 bit values
+        SIGNED_AP = frozenset({AP.TargetPosition, AP.ActualPosition, AP.TargetVelocity, AP.ActualVelocity,
+                               AP.RightLimit, AP.LeftLimit, AP.VirtualStopLeft, AP.VirtualStopRight,
+                               AP.MeasuredSpeed, AP.CurrentMeasuredSpeed, AP.RightLimitSwitchPosition,
+                               AP.LastReferencePosition, AP.EncoderPosition})
+
+        # Parameters only ever changed by the host, safe to serve from the cache.
+        # Live values (positions, velocities, flags, load) are deliberately absent.
+        STATIC_AP = frozenset({AP.MaxVelocity, AP.MaxAcceleration, AP.RunCurrent, AP.StandbyCurrent,
+                               AP.RampType, AP.StartVelocity, AP.StartAcceleration, AP.MaxDeceleration,
+                               AP.BreakVelocity, AP.FinalDeceleration, AP.StopVelocity, AP.StopDeceleration,
+                               AP.SwapStopSwitches, AP.EnableSoftStop, AP.MicrostepResolution,
+                               AP.ChopperBlankTime, AP.ConstantTOffMode, AP.DisableFastDecayComparator,
+                               AP.ChopperHysteresisEnd, AP.ChopperHysteresisStart, AP.TOff,
+                               AP.SEIMIN, AP.SECDS, AP.SmartEnergyHysteresis, AP.SECUS,
+                               AP.SmartEnergyHysteresisStart, AP.SG2FilterEnable, AP.SG2Threshold,
+                               AP.SmartEnergyStallVelocity, AP.SmartEnergyThresholdSpeed,
+                               AP.PWMThresholdSpeed, AP.PWMGrad, AP.PWMAmplitude, AP.PWMMode,
+                               AP.PWMFrequency, AP.PWMAutoscale, AP.ReferenceSearchMode,
+                               AP.ReferenceSearchSpeed, AP.RefSwitchSpeed, AP.MotorFullStepResolution,
+                               AP.FreewheelingMode, AP.EncoderResolution, AP.MaxPositionEncoderDeviation,
+                               AP.MaxVelocityEncoderDeviation, AP.PowerDownDelay, AP.ReverseShaft})
+
         class ENUM:
             microstep_resolution_fullstep = 0
             microstep_resolution_halfstep = 1
@@ -236,6 +692,20 @@ class TMCM3212(Steppermotor, TMCLModule):
             microstep_resolution_128_microsteps = 128
             microstep_resolution_256_microsteps = 256
 
+    # Duration of one TMCL WAIT tick in s
+    WAIT_TICK = 0.01
+    # Longest single WAIT in s, None for one WAIT over the whole timeout. The
+    # connection lock is held for the duration of each WAIT
+    WAIT_SLICE = None
+    # Whether the firmware executes WAIT as a direct command, None until the first try
+    _wait_supported = None
+
+    # User variable (GP bank 2) holding the stored profile hash of axis 0, axes 1 and 2 follow
+    PROFILE_HASH_VARIABLE = 252
+    # User variable set to 1 while the position counter of axis 0 is zeroed at its home
+    # switch, axes 1 and 2 follow. Never stored, so a power cycle clears it.
+    HOME_REFERENCE_VARIABLE = 249
+
     class GP0:
         SerialBaudRate      = 65
         SerialAddress       = 66
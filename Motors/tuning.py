@@ -0,0 +1,139 @@
+"""
+Velocity and acceleration tuning from StallGuard2 load values.
+
+    result = tune_axis(module, 0, window=(0, 200000), velocities=range(30000, 200001, 20000),
+                       accelerations=range(30000, 400001, 40000), margin=150)
+    profile = apply_tuned_profile(module, 0, "delay_line", result)
+    profiles.save_profiles("profiles.toml", {"delay_line": profile})
+
+The stored profile hash (see TMCM3212.apply_profile) only changes when the
+tuned profile is applied with `store`, as `apply_tuned_profile` does; until
+then the module keeps starting with the old values.
+"""
+import collections
+import logging
+import time
+
+from .profiles import get_profile
+
+logger = logging.getLogger(__name__)
+
+SweepPoint = collections.namedtuple("SweepPoint", "velocity acceleration min_load stalled seconds")
+
+
+def measure_move(module, axis, target, timeout=None, poll_interval=0.005):
+    """
+    Move `axis` to `target` and sample LoadValue until the move ends.
+
+    Returns (minimum LoadValue while moving, stalled, seconds). The move counts
+    as stalled when it stopped before reaching the target.
+    """
+    ap = module._MotorTypeA.AP
+    module.move_to(axis, target)
+    start_time = time.monotonic()
+    min_load = None
+    while True:
+        values = module.read_many(axis, [ap.PositionReachedFlag, ap.ActualVelocity, ap.LoadValue])
+        elapsed = time.monotonic() - start_time
+        if values[ap.PositionReachedFlag]:
+            return min_load, False, elapsed
+        if values[ap.ActualVelocity] != 0:
+            load = values[ap.LoadValue]
+            min_load = load if min_load is None else min(min_load, load)
+        elif elapsed > poll_interval * 4:
+            # Standing still off target: stopped on stall
+            module.stop(axis)
+            return 0 if min_load is None else min_load, True, elapsed
+        if timeout is not None and elapsed > timeout:
+            module.stop(axis)
+            return min_load, True, elapsed
+        time.sleep(poll_interval)
+
+
+def tune_axis(module, axis, window, velocities, accelerations, margin=100, stall_velocity=None,
+              timeout=30.0, poll_interval=0.005):
+    """
+    Sweep MaxVelocity and MaxAcceleration of `axis` with moves across `window`
+    (start, end) in microsteps and return the fastest setting that keeps the
+    load `margin`: the lowest LoadValue seen while moving must stay at or above
+    `margin`, and no move may stall.
+
+    Velocities are tried in ascending order, and for each velocity the
+    accelerations in ascending order until one fails; the sweep ends at the
+    first velocity where no acceleration passes. With `stall_velocity` the
+    module stops the motor on a stall above that velocity (StallGuard2 stop).
+    The previous MaxVelocity, MaxAcceleration and stall velocity are restored.
+
+    Returns {"velocity", "acceleration", "min_load", "seconds", "points"} with
+    the chosen setting (None if nothing passed) and every SweepPoint measured.
+    """
+    ap = module._MotorTypeA.AP
+    motor = module.motors[axis]
+    previous = module.read_many(axis, [ap.MaxVelocity, ap.MaxAcceleration, ap.SmartEnergyStallVelocity])
+    start, end = window
+    points = []
+    try:
+        if stall_velocity is not None:
+            motor.stallguard2.set_stop_velocity(stall_velocity)
+        module.move_to(axis, start)
+        module.wait_until_reached(axis, timeout)
+        for velocity in sorted(velocities):
+            passed = False
+            for acceleration in sorted(accelerations):
+                module.write_many(axis, {ap.MaxVelocity: velocity, ap.MaxAcceleration: acceleration})
+                min_load, stalled, seconds = measure_move(module, axis, end, timeout, poll_interval)
+                if not stalled:
+                    back_load, stalled, _ = measure_move(module, axis, start, timeout, poll_interval)
+                    min_load = min((load for load in (min_load, back_load) if load is not None), default=None)
+                point = SweepPoint(velocity, acceleration, min_load, stalled, seconds)
+                points.append(point)
+                logger.info("Axis %d v=%d a=%d: min load %s, stalled %s, %.3f s",
+                            axis, velocity, acceleration, min_load, stalled, seconds)
+                if stalled or min_load is None or min_load < margin:
+                    if stalled:
+                        # Return to the window start at the previous, safe speed
+                        module.write_many(axis, {ap.MaxVelocity: previous[ap.MaxVelocity],
+                                                 ap.MaxAcceleration: previous[ap.MaxAcceleration]})
+                        module.move_to(axis, start)
+                        module.wait_until_reached(axis, timeout)
+                    break
+                passed = True
+            if not passed:
+                break
+    finally:
+        module.write_many(axis, {ap.MaxVelocity: previous[ap.MaxVelocity],
+                                 ap.MaxAcceleration: previous[ap.MaxAcceleration],
+                                 ap.SmartEnergyStallVelocity: previous[ap.SmartEnergyStallVelocity]})
+
+    good = [point for point in points if not point.stalled and point.min_load is not None
+            and point.min_load >= margin]
+    if not good:
+        logger.warning("No setting of axis %d kept a load margin of %d", axis, margin)
+        return {"velocity": None, "acceleration": None, "min_load": None, "seconds": None, "points": points}
+    best = min(good, key=lambda point: (point.seconds, point.acceleration))
+    return {"velocity": best.velocity, "acceleration": best.acceleration, "min_load": best.min_load,
+            "seconds": best.seconds, "points": points}
+
+
+def tuned_profile(profile, result, profiles=None):
+    """
+    Copy of `profile` (name or dict) with MaxVelocity and MaxAcceleration from a
+    tune_axis result. Nothing is written to the module; see apply_tuned_profile.
+    """
+    if result["velocity"] is None:
+        raise ValueError("The tuning sweep found no setting to apply")
+    tuned = dict(get_profile(profile, profiles))
+    tuned["MaxVelocity"] = result["velocity"]
+    tuned["MaxAcceleration"] = result["acceleration"]
+    return tuned
+
+
+def apply_tuned_profile(module, axis, profile, result, store=True, profiles=None):
+    """
+    Apply the tuned copy of `profile` to `axis` and, with `store`, save it with
+    its hash to the EEPROM, so later starts trusting the stored profile get the
+    tuned values. Returns the tuned profile, e.g. for profiles.save_profiles.
+    """
+    tuned = tuned_profile(profile, result, profiles)
+    logger.info("Applied tuned profile: %s", module.apply_profile(axis, tuned, store=store))
+    return tuned
@@ -0,0 +1,91 @@
+import collections
+import math
+
+import numpy as np
+
+
+# Speed of light in mm/ps
+SPEED_OF_LIGHT = 0.299792458
+
+StepTargets = collections.namedtuple("StepTargets", ["steps", "clamped"])
+
+
+class UnitConverter:
+    """
+    Linear conversion between a physical unit and microsteps within travel limits.
+
+    `to_steps` converts a scalar or an array of targets in one NumPy pass,
+    rounding to the nearest microstep, and clamps to [min_steps, max_steps].
+    It returns the int32 steps together with a mask of the clamped targets.
+    `from_steps` is its exact inverse: converting a readback back to steps
+    gives the same microstep.
+    """
+    def __init__(self, steps_per_unit, min_steps, max_steps, zero_steps=0.0):
+        self.steps_per_unit = steps_per_unit
+        self.min_steps = math.ceil(min_steps)
+        self.max_steps = math.floor(max_steps)
+        self.zero_steps = zero_steps
+
+    def to_steps(self, values):
+        raw = np.rint(np.asarray(values, dtype=np.float64) * self.steps_per_unit + self.zero_steps)
+        if not np.isfinite(raw).all():
+            raise ValueError("Targets must be finite")
+        steps = np.clip(raw, self.min_steps, self.max_steps)
+        return StepTargets(steps.astype(np.int32), steps != raw)
+
+    def from_steps(self, steps):
+        return (np.asarray(steps, dtype=np.float64) - self.zero_steps) / self.steps_per_unit
+
+
+def delay_units(delay, unit="mm", time_zero_mm=0.0):
+    """
+    Converter for a DelayLine in mm of stage travel, or in ps of optical delay.
+
+    The beam passes the delay stage twice, so 1 ps is c/2 = 0.15 mm of travel.
+    Delays in ps are counted from the stage position `time_zero_mm`.
+    """
+    steps_per_mm = delay.steps_rev / delay.lead_pitch
+    if unit == "mm":
+        return UnitConverter(steps_per_mm, delay.min_position, delay.max_position)
+    if unit == "ps":
+        return UnitConverter(steps_per_mm * SPEED_OF_LIGHT / 2, delay.min_position, delay.max_position,
+                             zero_steps=time_zero_mm * steps_per_mm)
+    raise ValueError(f"Unknown delay unit {unit!r}, expected 'mm' or 'ps'")
+
+
+def angle_units(paddler):
+    """Converter for a PolarizationPaddler in degrees."""
+    return UnitConverter(paddler.steps_rev / 360, paddler.min_position, paddler.max_position)
+
+
+class ScanPlan:
+    """Compiled two-axis scan: int32 microstep targets of both axes and their clamp masks."""
+    __slots__ = ("delay_steps", "angle_steps", "delay_clamped", "angle_clamped")
+
+    def __init__(self, delay_targets, angle_targets):
+        self.delay_steps, self.delay_clamped = delay_targets
+        self.angle_steps, self.angle_clamped = angle_targets
+
+    def __len__(self):
+        return len(self.delay_steps)
+
+    @property
+    def clamped(self):
+        """Indices of the points where either axis was clamped to its travel limits."""
+        return np.flatnonzero(self.delay_clamped | self.angle_clamped)
+
+
+def compile_scan(delay_converter, angle_converter, delays, angles, raster=True):
+    """
+    Convert scan targets to a ScanPlan in one vectorized pass per axis.
+
+    With `raster`, every delay is visited at every angle, delays varying
+    fastest. Otherwise `delays` and `angles` are paired point by point.
+    """
+    delays = np.asarray(delays, dtype=np.float64).ravel()
+    angles = np.asarray(angles, dtype=np.float64).ravel()
+    if raster:
+        delays, angles = np.tile(delays, len(angles)), np.repeat(angles, len(delays))
+    elif len(delays) != len(angles):
+        raise ValueError("delays and angles must have the same length")
+    return ScanPlan(delay_converter.to_steps(delays), angle_converter.to_steps(angles))
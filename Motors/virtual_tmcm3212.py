@@ -0,0 +1,672 @@
+import collections
+import logging
+import math
+import os
+import random
+import select
+import termios
+import threading
+import time
+
+from pytrinamic.connections.tmcl_interface import TmclInterface
+from pytrinamic.tmcl import TMCLCommand, TMCLReply, TMCLRequest, TMCLStatus
+from pytrinamic.helpers import to_signed_32
+
+from .trinamic_controller import TMCM3212
+
+
+AP = TMCM3212._MotorTypeA.AP
+GP0 = TMCM3212.GP0
+
+
+class VirtualAxis:
+    """
+    One simulated TMCM-3212 axis.
+
+    Positions are in microsteps. `home_position` is where the home switch
+    becomes active; it stays active for positions on the `home_side` (+1 or
+    -1) of it. `left_endstop` and `right_endstop` stop the axis when reached.
+    The switch reads 0 when active if `home_active_low` is set, as on the delay
+    line stage.
+
+    The encoder follows the rotor; `encoder_slip` is how many microsteps the
+    rotor lags behind the step counter, so setting it simulates lost steps.
+    """
+    def __init__(self, start_position=0, home_position=0, home_side=1, home_active_low=True,
+                 left_endstop=None, right_endstop=None, load_base=600, load_per_velocity=0.0,
+                 load_per_acceleration=0.0):
+        self.physical = float(start_position)
+        self.offset = 0.0
+        self.velocity = 0.0
+        self.acceleration = 0.0
+        self.mode = "position"
+        self.target = self.physical
+        self.target_velocity = 0.0
+        self.home_position = home_position
+        self.home_side = home_side
+        self.home_active_low = home_active_low
+        self.left_endstop = left_endstop
+        self.right_endstop = right_endstop
+        self.load_base = load_base
+        self.load_per_velocity = load_per_velocity
+        self.load_per_acceleration = load_per_acceleration
+        self.reference = None
+        self.encoder_offset = 0.0
+        self.encoder_slip = 0.0
+        self.params = collections.defaultdict(int)
+        self.params.update({
+            AP.MaxVelocity: 51200, AP.MaxAcceleration: 51200, AP.RunCurrent: 16, AP.StandbyCurrent: 8,
+            AP.MicrostepResolution: 8, AP.ReferenceSearchMode: 1, AP.ReferenceSearchSpeed: 51200,
+            AP.RefSwitchSpeed: 10240, AP.EncoderResolution: 51200, AP.PWMAmplitude: 128,
+            AP.MotorFullStepResolution: 200,
+        })
+        self.eeprom = dict(self.params)
+
+    # Sensors
+    def home_switch_active(self):
+        return (self.physical - self.home_position) * self.home_side >= 0
+
+    def left_endstop_active(self):
+        return self.left_endstop is not None and self.physical <= self.left_endstop
+
+    def right_endstop_active(self):
+        return self.right_endstop is not None and self.physical >= self.right_endstop
+
+    @property
+    def position(self):
+        return self.physical - self.offset
+
+    @property
+    def encoder_position(self):
+        return (self.physical - self.encoder_slip - self.encoder_offset) * self.encoder_ratio()
+
+    def encoder_ratio(self):
+        microsteps = self.params[AP.MotorFullStepResolution] * (1 << self.params[AP.MicrostepResolution])
+        return self.params[AP.EncoderResolution] / microsteps
+
+    def position_reached(self):
+        return self.mode == "position" and self.velocity == 0 and self.physical == self.target
+
+    def load_value(self):
+        load = self.load_base - self.load_per_velocity * abs(self.velocity) \
+            - self.load_per_acceleration * abs(self.acceleration)
+        return max(0, int(load))
+
+    # Commands
+    def move_to(self, position):
+        self.mode = "position"
+        self.target = float(position) + self.offset
+        self.reference = None
+
+    def rotate(self, velocity):
+        self.mode = "velocity"
+        self.target_velocity = float(velocity)
+        self.reference = None
+
+    def stop(self):
+        self.rotate(0)
+
+    def start_reference_search(self):
+        mode = self.params[AP.ReferenceSearchMode] & 0x0F
+        search = {1: -1, 2: 1, 3: 1, 4: -1, 5: -1, 6: 1, 7: 1, 8: -1}.get(mode, -1)
+        self.reference = {"mode": mode, "direction": search, "phase": "search"}
+        self.mode = "reference"
+
+    def stop_reference_search(self):
+        self.reference = None
+        self.rotate(0)
+
+    def reference_search_active(self):
+        return self.reference is not None
+
+    # Motion
+    def advance(self, dt, step=1e-3):
+        while dt > 0:
+            if self.velocity == 0 and ((self.mode == "position" and self.physical == self.target) or
+                                       (self.mode == "velocity" and self.target_velocity == 0) or
+                                       self._held_by_endstop()):
+                self.acceleration = 0.0
+                return
+            h = min(step, dt)
+            dt -= h
+            self._step(h)
+
+    def _step(self, h):
+        a = max(self.params[AP.MaxAcceleration], 1)
+        v_max = max(self.params[AP.MaxVelocity], 1)
+        v_old = self.velocity
+
+        if self.mode == "position":
+            remaining = self.target - self.physical
+            if remaining == 0 and self.velocity == 0:
+                self.acceleration = 0.0
+                return
+            if self.velocity == 0 and self._held_by_endstop():
+                # The target stays unreached
+                self.acceleration = 0.0
+                return
+            v_desired = math.copysign(min(v_max, math.sqrt(2 * a * abs(remaining))), remaining)
+            self._approach(v_desired, a, h)
+            new_position = self.physical + self.velocity * h
+            if (self.target - new_position) * remaining <= 0:
+                new_position = self.target
+                self.velocity = 0.0
+            self.physical = new_position
+        elif self.mode == "velocity":
+            self._approach(max(-v_max, min(v_max, self.target_velocity)), a, h)
+            self.physical += self.velocity * h
+        elif self.mode == "reference":
+            self._reference_step(a, h)
+
+        self.acceleration = (self.velocity - v_old) / h
+        stall_velocity = self.params[AP.SmartEnergyStallVelocity]
+        if stall_velocity and abs(self.velocity) >= stall_velocity and self.load_value() == 0:
+            # Stop on stall: the motor halts where it is and the target stays unreached
+            self.velocity = 0.0
+            self.stop()
+            return
+        if self.mode != "reference" and self.velocity != 0:
+            if (self.velocity < 0 and self.left_endstop_active()) or (self.velocity > 0 and self.right_endstop_active()):
+                self.velocity = 0.0
+                self.target_velocity = 0.0
+
+    def _held_by_endstop(self):
+        if self.mode != "position":
+            return False
+        remaining = self.target - self.physical
+        return (remaining < 0 and self.left_endstop_active()) or (remaining > 0 and self.right_endstop_active())
+
+    def _approach(self, v_desired, a, h):
+        dv = v_desired - self.velocity
+        limit = a * h
+        self.velocity = v_desired if abs(dv) <= limit else self.velocity + math.copysign(limit, dv)
+
+    def _reference_step(self, a, h):
+        ref = self.reference
+        mode = ref["mode"]
+        if ref["phase"] == "search":
+            if mode <= 4:
+                found = self.left_endstop_active() if ref["direction"] < 0 else self.right_endstop_active()
+                edge = self.left_endstop if ref["direction"] < 0 else self.right_endstop
+            else:
+                found = self.home_switch_active()
+                edge = self.home_position
+            if found:
+                if mode in (2, 3) and ref["direction"] > 0:
+                    # Right switch first, then search the left one
+                    ref["direction"] = -1
+                    return
+                ref["phase"] = "approach"
+                ref["edge"] = float(edge)
+            else:
+                if (ref["direction"] < 0 and self.left_endstop_active()) or \
+                        (ref["direction"] > 0 and self.right_endstop_active()):
+                    if mode in (5, 6):
+                        ref["direction"] = -ref["direction"]
+                    else:
+                        self.velocity = 0.0
+                        return
+                self._approach(ref["direction"] * self.params[AP.ReferenceSearchSpeed], a, h)
+                self.physical += self.velocity * h
+                return
+
+        # Creep back to the switch edge at RefSwitchSpeed and latch it there
+        remaining = ref["edge"] - self.physical
+        speed = max(self.params[AP.RefSwitchSpeed], 1)
+        if abs(self.velocity) > speed or (self.velocity * remaining < 0):
+            self._approach(0.0, a, h)
+            self.physical += self.velocity * h
+            return
+        self.velocity = math.copysign(speed, remaining) if remaining else 0.0
+        if abs(remaining) <= speed * h:
+            self.physical = ref["edge"]
+            self.velocity = 0.0
+            self.params[AP.LastReferencePosition] = int(round(self.position))
+            self.offset = self.physical
+            self.target = self.physical
+            self.mode = "position"
+            self.reference = None
+        else:
+            self.physical += self.velocity * h
+
+
+class VirtualTMCM3212:
+    """
+    Simulated TMCM-3212 answering TMCL requests.
+
+    Time runs `time_scale` times faster than the host clock, so long moves and
+    reference searches can be simulated in accelerated time.
+    """
+    GROUP_COMMANDS = frozenset((TMCLCommand.ROR, TMCLCommand.ROL, TMCLCommand.MST, TMCLCommand.MVP))
+    # Binary firmware version reply: module type 3212, version 1.0
+    FIRMWARE_VERSION = (3212 << 16) | 0x0100
+    WAIT_TICK = 0.01
+    # Whether WAIT is accepted as a direct command; otherwise it is answered with INVALID_COMMAND
+    direct_wait = True
+
+    def __init__(self, axes=None, module_id=1, time_scale=1.0, analog_inputs=None, digital_inputs=None):
+        self.axes = axes if axes is not None else [VirtualAxis() for _ in range(3)]
+        self.module_id = module_id
+        self.time_scale = time_scale
+        self.analog_inputs = collections.defaultdict(int, analog_inputs or {})
+        self.digital_inputs = collections.defaultdict(int, digital_inputs or {})
+        self.digital_outputs = collections.defaultdict(int)
+        self.global_params = collections.defaultdict(int)
+        self.global_eeprom = {}
+        self._last_update = time.monotonic()
+
+        # TMCL standalone program memory and interpreter state
+        self.program = {}
+        self.program_counter = 0
+        self.application_status = 0
+        self.download_address = None
+        self.clock = 0.0
+        self._wait_until = None
+
+    def update(self):
+        now = time.monotonic()
+        dt = (now - self._last_update) * self.time_scale
+        self._last_update = now
+        # A running program is interleaved with the motion in 1 ms steps
+        while self.application_status == 1 and dt > 0:
+            self._run_program()
+            h = min(dt, 1e-3)
+            for axis in self.axes:
+                axis.advance(h)
+            self.clock += h
+            dt -= h
+        for axis in self.axes:
+            axis.advance(dt)
+        self.clock += dt
+
+    def _run_program(self, max_instructions=1000):
+        """Execute program instructions until a WAIT blocks, the program stops or the budget is used."""
+        for _ in range(max_instructions):
+            if self.application_status != 1:
+                return
+            instruction = self.program.get(self.program_counter)
+            if instruction is None:
+                self.application_status = 0
+                return
+            command, command_type, motor, value = instruction
+            if command == TMCLCommand.WAIT:
+                if not self._wait_done(command_type, motor, value):
+                    return
+                self._wait_until = None
+                self.program_counter += 1
+            elif command == TMCLCommand.JA:
+                self.program_counter = value
+            elif command == TMCLCommand.DJNZ:
+                counter = self.global_params[(2, command_type)] - 1
+                self.global_params[(2, command_type)] = counter
+                self.program_counter = value if counter != 0 else self.program_counter + 1
+            elif command == TMCLCommand.STOP:
+                self.application_status = 0
+                self.program_counter += 1
+            else:
+                try:
+                    status, _ = self._execute(TMCLRequest(self.module_id, command, command_type, motor, value))
+                except (IndexError, KeyError):
+                    status = TMCLStatus.WRONG_TYPE
+                if status != TMCLStatus.SUCCESS:
+                    self.application_status = 0
+                    return
+                self.program_counter += 1
+
+    def _wait_done(self, command_type, motor, ticks):
+        if self._wait_until is None:
+            self._wait_until = self.clock + ticks * self.WAIT_TICK
+        if command_type == 0:
+            return self.clock >= self._wait_until
+        timed_out = ticks != 0 and self.clock >= self._wait_until
+        return self._wait_condition(command_type, motor) or timed_out
+
+    def _wait_condition(self, command_type, motor):
+        if command_type == 0:
+            return False
+        if command_type == 1:
+            return self.axes[motor].position_reached()
+        if command_type == 4:
+            return not self.axes[motor].reference_search_active()
+        # Switch conditions are not simulated
+        return True
+
+    def handle(self, request):
+        """
+        Execute `request` and return the TMCLReply, or None for frames addressed
+        elsewhere. Frames to the secondary address (GP 87) are executed without
+        a reply, as every module of the group receives them.
+        """
+        secondary = self.global_params[(0, GP0.serialSecondaryAddress)]
+        if request.moduleAddress != self.module_id:
+            if not secondary or request.moduleAddress != secondary:
+                return None
+            self.update()
+            try:
+                self._execute(request)
+            except (IndexError, KeyError):
+                pass
+            return None
+        self.update()
+        # A frame arriving while replies are suppressed is not answered, even the one switching them on again
+        suppressed = self.global_params[(0, GP0.SuppressReply)]
+        if self.download_address is not None and request.command != TMCLCommand.QUIT_DOWNLOAD_MODE:
+            self.program[self.download_address] = (request.command, request.commandType, request.motorBank,
+                                                   to_signed_32(request.value))
+            self.download_address += 1
+            return TMCLReply(2, self.module_id, TMCLStatus.COMMAND_LOADED, request.command, 0)
+        if request.command == TMCLCommand.WAIT and self.direct_wait and not suppressed:
+            return _PendingWait(self, request)
+        try:
+            status, value = self._execute(request)
+        except (IndexError, KeyError):
+            status, value = TMCLStatus.WRONG_TYPE, 0
+        if suppressed:
+            return None
+        return TMCLReply(2, self.module_id, status, request.command, value)
+
+    def _execute(self, request):
+        command = request.command
+        command_type = request.commandType
+        motor = request.motorBank
+        value = to_signed_32(request.value)
+
+        if command in self.GROUP_COMMANDS and self.axes[motor].params[AP.GroupIndex]:
+            # Axes sharing a group index execute motion commands together
+            group = self.axes[motor].params[AP.GroupIndex]
+            for index, axis in enumerate(self.axes):
+                if index != motor and axis.params[AP.GroupIndex] == group:
+                    self._execute_motion(axis, command, command_type, value)
+        if command in self.GROUP_COMMANDS:
+            self._execute_motion(self.axes[motor], command, command_type, value)
+        elif command == TMCLCommand.SAP:
+            self._set_axis_parameter(self.axes[motor], command_type, value)
+        elif command == TMCLCommand.GAP:
+            return TMCLStatus.SUCCESS, self._get_axis_parameter(self.axes[motor], command_type)
+        elif command == TMCLCommand.STAP:
+            self.axes[motor].eeprom[command_type] = self.axes[motor].params[command_type]
+        elif command == TMCLCommand.RSAP:
+            axis = self.axes[motor]
+            axis.params[command_type] = axis.eeprom.get(command_type, 0)
+        elif command == TMCLCommand.SGP:
+            self.global_params[(motor, command_type)] = value
+        elif command == TMCLCommand.GGP:
+            live = {(0, 128): self.application_status, (0, 130): self.program_counter}
+            return TMCLStatus.SUCCESS, live.get((motor, command_type), self.global_params[(motor, command_type)])
+        elif command == TMCLCommand.STGP:
+            self.global_eeprom[(motor, command_type)] = self.global_params[(motor, command_type)]
+        elif command == TMCLCommand.RSGP:
+            self.global_params[(motor, command_type)] = self.global_eeprom.get((motor, command_type), 0)
+        elif command == TMCLCommand.RFS:
+            axis = self.axes[motor]
+            if command_type == 0:
+                axis.start_reference_search()
+            elif command_type == 1:
+                axis.stop_reference_search()
+            elif command_type == 2:
+                return TMCLStatus.SUCCESS, int(axis.reference_search_active())
+            else:
+                return TMCLStatus.WRONG_TYPE, 0
+        elif command == TMCLCommand.SIO:
+            self.digital_outputs[command_type] = value
+        elif command == TMCLCommand.GIO:
+            bank = {0: self.digital_inputs, 1: self.analog_inputs, 2: self.digital_outputs}[motor]
+            return TMCLStatus.SUCCESS, bank[command_type]
+        elif command == TMCLCommand.START_DOWNLOAD_MODE:
+            self.application_status = 0
+            self.download_address = value
+        elif command == TMCLCommand.QUIT_DOWNLOAD_MODE:
+            self.download_address = None
+        elif command == TMCLCommand.RUN_APPLICATION:
+            if command_type == 1:
+                self.program_counter = value
+            self._wait_until = None
+            self.application_status = 1
+        elif command == TMCLCommand.STOP_APPLICATION:
+            self.application_status = 0
+        elif command == TMCLCommand.RESET_APPLICATION:
+            self.application_status = 0
+            self.program_counter = 0
+        elif command == TMCLCommand.GET_APPLICATION_STATUS:
+            return TMCLStatus.SUCCESS, self.application_status
+        elif command == TMCLCommand.GET_FIRMWARE_VERSION:
+            return TMCLStatus.SUCCESS, self.FIRMWARE_VERSION
+        else:
+            return TMCLStatus.INVALID_COMMAND, 0
+        return TMCLStatus.SUCCESS, value
+
+    @staticmethod
+    def _execute_motion(axis, command, command_type, value):
+        if command in (TMCLCommand.ROR, TMCLCommand.ROL):
+            axis.rotate(value if command == TMCLCommand.ROR else -value)
+        elif command == TMCLCommand.MST:
+            axis.stop()
+        elif command == TMCLCommand.MVP:
+            axis.move_to(value + axis.position if command_type == 1 else value)
+
+    def _set_axis_parameter(self, axis, index, value):
+        if index == AP.ActualPosition:
+            axis.offset = axis.physical - value
+            if axis.mode == "position" and axis.velocity == 0:
+                axis.target = axis.physical
+        elif index == AP.TargetPosition:
+            axis.move_to(value)
+        elif index == AP.EncoderPosition:
+            axis.encoder_offset = axis.physical - axis.encoder_slip - value / axis.encoder_ratio()
+        elif index == AP.ClosedLoopMode:
+            axis.params[index] = value
+            # The initialization finishes at once and finds the rotor phase as offset
+            if value == 1:
+                axis.params[AP.CLoffset] = int(round(axis.physical - axis.encoder_slip)) % 1024
+        else:
+            axis.params[index] = value
+
+    def _get_axis_parameter(self, axis, index):
+        switch = {True: 0, False: 1} if axis.home_active_low else {True: 1, False: 0}
+        live = {
+            AP.TargetPosition: lambda: int(round(axis.target - axis.offset)),
+            AP.ActualPosition: lambda: int(round(axis.position)),
+            AP.ActualVelocity: lambda: int(round(axis.velocity)),
+            AP.PositionReachedFlag: lambda: int(axis.position_reached()),
+            AP.HomeSwitch: lambda: switch[axis.home_switch_active()],
+            AP.LeftEndstop: lambda: int(axis.left_endstop_active()),
+            AP.RightEndstop: lambda: int(axis.right_endstop_active()),
+            AP.LoadValue: axis.load_value,
+            AP.EncoderPosition: lambda: int(round(axis.encoder_position)),
+            AP.ClosedLoopInitFlag: lambda: int(axis.params[AP.ClosedLoopMode] == 1),
+        }
+        getter = live.get(index)
+        return (getter() if getter else axis.params[index]) & 0xFFFFFFFF
+
+
+class _PendingWait:
+    """Reply to a WAIT sent as a direct command, ready once its condition holds or its ticks have passed."""
+    def __init__(self, module, request):
+        self.module = module
+        self.request = request
+        ticks = request.value
+        self.deadline = module.clock + ticks * module.WAIT_TICK if ticks else None
+
+    def poll(self):
+        module = self.module
+        module.update()
+        request = self.request
+        if module._wait_condition(request.commandType, request.motorBank) or \
+                (self.deadline is not None and module.clock >= self.deadline):
+            return TMCLReply(2, module.module_id, TMCLStatus.SUCCESS, TMCLCommand.WAIT, 0)
+        return None
+
+    def result(self, lock, interval=0.001):
+        """Block until the reply is ready, polling the module under `lock`."""
+        while True:
+            with lock:
+                reply = self.poll()
+            if reply is not None:
+                return reply
+            time.sleep(interval)
+
+
+class VirtualTMCM3212Connection(TmclInterface):
+    """
+    In-process stand-in for a pytrinamic TMCL connection to one or more virtual modules.
+
+    Each reply becomes available `latency` s (plus up to `jitter` s) after its
+    request was sent. With a `datarate` the frames also occupy the bus for
+    their serial transmission time, one after the other.
+    """
+    def __init__(self, modules=None, latency=0.0, jitter=0.0, datarate=None, seed=None, host_id=2, module_id=1):
+        TmclInterface.__init__(self, host_id, module_id)
+        self.logger = logging.getLogger("VirtualTMCM3212Connection")
+        if modules is None:
+            modules = [VirtualTMCM3212(module_id=module_id)]
+        elif isinstance(modules, VirtualTMCM3212):
+            modules = [modules]
+        self.modules = {module.module_id: module for module in modules}
+        self.latency = latency
+        self.jitter = jitter
+        self._baudrate = datarate
+        self.frame_time = 2 * 9 * 10 / datarate if datarate else 0.0
+        self.frames = 0
+        self._random = random.Random(seed)
+        self._pending = collections.deque()
+        self._bus_free = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def time_scale(self):
+        """Speed-up of the simulated time, so host-side predictions can be scaled to match."""
+        return max(module.time_scale for module in self.modules.values())
+
+    @property
+    def module(self):
+        """The virtual module when the bus holds exactly one."""
+        return next(iter(self.modules.values()))
+
+    def _send(self, host_id, module_id, data):
+        request = TMCLRequest.from_buffer(data)
+        with self._lock:
+            self.frames += 1
+            replies = [module.handle(request) for module in self.modules.values()]
+            replies = [reply for reply in replies if reply is not None]
+            now = time.monotonic()
+            ready = now + self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if self.frame_time:
+                ready = max(ready, self._bus_free) + self.frame_time
+                self._bus_free = ready
+            for reply in replies:
+                self._pending.append((ready, reply))
+
+    def _recv(self, host_id, module_id):
+        with self._lock:
+            if not self._pending:
+                raise RuntimeError("TMCL datagram timed out")
+            ready, reply = self._pending.popleft()
+        delay = ready - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if isinstance(reply, _PendingWait):
+            reply = reply.result(self._lock)
+        return reply.to_buffer()
+
+    def _reply_check(self, reply):
+        pass
+
+    @staticmethod
+    def list():
+        return ["virtual"]
+
+    def __str__(self):
+        return "Connection: type={} modules={}".format(type(self).__name__, sorted(self.modules))
+
+
+class VirtualSerialLine:
+    """
+    Pseudo-terminal stand-in for the serial line to a virtual TMCM-3212.
+
+    Open `port` with pyserial like a real serial port. The module understands
+    the host only while the host side of the pty is set to the data rate in
+    its SerialBaudRate (GP 65), and answers anything else with line noise;
+    rates outside RATES never match. A
+    new rate takes effect after the reply to the SGP setting it. Above
+    `max_reliable_rate` every `error_every`-th reply is corrupted.
+    """
+    # SerialBaudRate codes the pty can represent
+    RATES = {0: 9600, 2: 19200, 4: 38400, 5: 57600, 7: 115200, 8: 230400, 10: 500000, 11: 1000000}
+
+    def __init__(self, module=None, baud_rate=115200, max_reliable_rate=None, error_every=5):
+        self.module = module if module is not None else VirtualTMCM3212()
+        codes = {rate: code for code, rate in self.RATES.items()}
+        self.module.global_params[(0, GP0.SerialBaudRate)] = codes[baud_rate]
+        self.max_reliable_rate = max_reliable_rate
+        self.error_every = error_every
+        self.replies = 0
+        self._speeds = {getattr(termios, f"B{rate}"): rate for rate in self.RATES.values()}
+        self._lock = threading.Lock()
+        self._master, self._slave = os.openpty()
+        self.port = os.ttyname(self._slave)
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name="virtual-serial-line", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def host_rate(self):
+        return self._speeds.get(termios.tcgetattr(self._master)[4])
+
+    def _serve(self):
+        data = b""
+        while self._running:
+            if not select.select([self._master], [], [], 0.05)[0]:
+                continue
+            data += os.read(self._master, 64)
+            while len(data) >= 9:
+                frame, data = data[:9], data[9:]
+                os.write(self._master, self._answer(frame))
+
+    def _answer(self, frame):
+        rate = self.RATES.get(self.module.global_params[(0, GP0.SerialBaudRate)])
+        if rate is None or self.host_rate() != rate:
+            return bytes(9)
+        reply = self.module.handle(TMCLRequest.from_buffer(frame))
+        if reply is None:
+            return b""
+        if isinstance(reply, _PendingWait):
+            reply = reply.result(self._lock)
+        data = bytearray(reply.to_buffer())
+        self.replies += 1
+        if self.max_reliable_rate is not None and rate > self.max_reliable_rate and \
+                self.replies % self.error_every == 0:
+            data[7] ^= 0x10
+        return bytes(data)
+
+
+def virtual_instrument(time_scale=1.0, latency=0.0, jitter=0.0, datarate=None, seed=None):
+    """
+    Connection to a virtual TMCM-3212 wired like the instrument: the delay line
+    stage on axis 0 (home switch active low, 10 mm of travel) and the
+    polarization paddle on axis 1.
+    """
+    axes = [
+        VirtualAxis(start_position=-15000, home_position=0, home_side=1, home_active_low=True,
+                    left_endstop=-30000, right_endstop=110000),
+        VirtualAxis(start_position=20000, home_position=0, home_side=-1, home_active_low=False),
+        VirtualAxis(),
+    ]
+    module = VirtualTMCM3212(axes, time_scale=time_scale)
+    return VirtualTMCM3212Connection(module, latency=latency, jitter=jitter, datarate=datarate, seed=seed)
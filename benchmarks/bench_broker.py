@@ -0,0 +1,75 @@
+"""
+Latency and throughput of ActualPosition polls through the TMCL broker against
+direct access, with 1, 4 and 16 client processes sharing one virtual TMCM-3212.
+
+    python benchmarks/bench_broker.py --latency 0.001 --clients 1 4 16
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Motors.broker import BrokerConnection, TmclBroker
+from Motors.trinamic_controller import TMCM3212
+from Motors.virtual_tmcm3212 import virtual_instrument
+from benchmarks.common import save_results, summarize, timed
+
+
+def poll(connection, polls):
+    module = TMCM3212(connection)
+    ap = module._MotorTypeA.AP
+    start = time.perf_counter()
+    samples = [timed(module.get_axis_parameter, ap.ActualPosition, 0)[0] for _ in range(polls)]
+    return start, time.perf_counter(), samples
+
+
+def client(path, polls, results):
+    connection = BrokerConnection(path)
+    results.put(poll(connection, polls))
+    connection.close()
+
+
+def run_clients(path, clients, polls):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client, args=(path, polls, results)) for _ in range(clients)]
+    for process in processes:
+        process.start()
+    runs = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    samples = [sample for run in runs for sample in run[2]]
+    elapsed = max(run[1] for run in runs) - min(run[0] for run in runs)
+    return samples, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.001, help="injected per-command bus latency in s")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--polls", type=int, default=500, help="polls per client")
+    parser.add_argument("--output", default="bench_broker.json")
+    args = parser.parse_args(argv)
+
+    start, end, samples = poll(virtual_instrument(latency=args.latency), args.polls)
+    results = {"direct": dict(summarize(samples), polls_per_s=len(samples) / (end - start))}
+    print(f"   direct: p50 {results['direct']['p50_ms']:.3f} ms, {results['direct']['polls_per_s']:.0f} polls/s")
+
+    path = os.path.join(tempfile.mkdtemp(), "tmcm3212.sock")
+    for clients in args.clients:
+        broker = TmclBroker(virtual_instrument(latency=args.latency), path).start()
+        samples, elapsed = run_clients(path, clients, args.polls)
+        broker.close()
+        result = dict(summarize(samples), polls_per_s=len(samples) / elapsed, **broker.stats())
+        results[f"{clients} clients"] = result
+        print(f"{clients:>2} client: p50 {result['p50_ms']:.3f} ms, p99 {result['p99_ms']:.3f} ms, "
+              f"{result['polls_per_s']:.0f} polls/s, {result['bus_frames']} bus frames for "
+              f"{result['requests']} requests")
+    save_results(args.output, "broker", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Object count, construction time and memory of DelayLine and PolarizationPaddler
+on several TMCM-3212 modules sharing one virtual bus.
+
+"eager" rebuilds the previous layout for comparison: every wrapper builds its
+own TMCM3212 plus a second one in `module`, each with all four feature
+modules on all three axes. "shared" is the current layout.
+
+    python benchmarks/bench_construction.py --modules 4
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pytrinamic.features.motor_control import MotorControl
+from pytrinamic.features.linear_ramp import LinearRamp
+from pytrinamic.features.drive_setting import DriveSetting
+from pytrinamic.features.stallguard2 import StallGuard2
+from pytrinamic.features.coolstep import CoolStep
+
+from Motors.Delay_line import DelayLine
+from Motors.Polarization import PolarizationPaddler
+from Motors.trinamic_controller import TMCM3212
+from Motors.virtual_tmcm3212 import VirtualTMCM3212, VirtualTMCM3212Connection
+from benchmarks.common import save_results, timed
+
+FEATURES = (LinearRamp, DriveSetting, StallGuard2, CoolStep)
+
+
+def eager(connection, module_id):
+    # Both wrappers of the previous layout: each one a controller plus a second
+    # controller in `module`, all feature modules built, and the profile applied
+    modules = [TMCM3212(connection, module_id) for _ in range(4)]
+    for module in modules:
+        for motor in module.motors:
+            motor.drive_settings, motor.linear_ramp, motor.stallguard2, motor.coolstep
+    for axis, profile, module in ((0, "delay_line", modules[1]), (1, "polarization_paddler", modules[3])):
+        module.apply_profile(axis, profile)
+        module.motors[axis].actual_position = 0
+    return modules
+
+
+def count_objects():
+    gc.collect()
+    objects = gc.get_objects()
+    return {
+        "controllers": sum(isinstance(o, TMCM3212) for o in objects),
+        "motors": sum(isinstance(o, MotorControl) for o in objects),
+        "features": sum(isinstance(o, FEATURES) for o in objects),
+    }
+
+
+def build(modules, layout):
+    connection = VirtualTMCM3212Connection([VirtualTMCM3212(module_id=i) for i in range(1, modules + 1)])
+    wrappers = []
+    for module_id in range(1, modules + 1):
+        if layout == "eager":
+            wrappers.extend(eager(connection, module_id))
+        else:
+            wrappers.append(DelayLine(connection, module_id))
+            wrappers.append(PolarizationPaddler(connection, module_id))
+    return wrappers
+
+
+def measure(modules, layout, repeat):
+    times = sorted(timed(build, modules, layout)[0] for _ in range(repeat))
+    tracemalloc.start()
+    wrappers = build(modules, layout)
+    memory, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = dict(count_objects(), median_ms=times[len(times) // 2] * 1e3, memory_kib=memory / 1024,
+                  peak_kib=peak / 1024)
+    del wrappers
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default="bench_construction.json")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for layout in ("eager", "shared"):
+        result = results[layout] = measure(args.modules, layout, args.repeat)
+        print(f"{layout:>6}: {result['controllers']} controllers, {result['motors']} motors, "
+              f"{result['features']} features, {result['median_ms']:.1f} ms, "
+              f"{result['memory_kib']:.0f} KiB (peak {result['peak_kib']:.0f} KiB)")
+    save_results(args.output, "construction", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
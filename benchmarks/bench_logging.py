@@ -0,0 +1,62 @@
+"""
+Per-poll overhead of logging in DelayLine.get_position on the virtual TMCM-3212.
+
+"legacy" reproduces the old behaviour, an f-string logged per poll to a
+synchronous FileHandler; "queued" is the current rate-limited, lazily formatted
+logging through a QueueHandler; "off" is the poll with logging disabled.
+
+    python benchmarks/bench_logging.py --polls 5000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Motors.Delay_line import DelayLine
+from Motors.log_config import configure_logging
+from Motors.virtual_tmcm3212 import virtual_instrument
+from benchmarks.common import save_results, summarize, timed
+
+
+def legacy_poll(delay, legacy_logger):
+    position = delay.motor.get_axis_parameter(delay.motor.AP.ActualPosition)
+    legacy_logger.info(f'Current motor position: {position}')
+    return position
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--polls", type=int, default=5000)
+    parser.add_argument("--output", default="bench_logging.json")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    delay = DelayLine(virtual_instrument(latency=0))
+    motors_logger = logging.getLogger("Motors")
+
+    legacy_logger = logging.getLogger("legacy")
+    legacy_logger.propagate = False
+    legacy_handler = logging.FileHandler(os.path.join(directory, "legacy.txt"))
+    legacy_handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+    legacy_logger.addHandler(legacy_handler)
+    legacy_logger.setLevel(logging.INFO)
+
+    results = {}
+    motors_logger.setLevel(logging.WARNING)
+    results["off"] = summarize([timed(delay.get_position)[0] for _ in range(args.polls)])
+    results["legacy"] = summarize([timed(legacy_poll, delay, legacy_logger)[0] for _ in range(args.polls)])
+    listener = configure_logging(os.path.join(directory, "queued.txt"), logger="Motors")
+    results["queued"] = summarize([timed(delay.get_position)[0] for _ in range(args.polls)])
+    listener.stop()
+
+    for mode, summary in results.items():
+        print(f"{mode:>7}: p50 {summary['p50_ms'] * 1e3:.1f} us, p99 {summary['p99_ms'] * 1e3:.1f} us, "
+              f"mean {summary['mean_ms'] * 1e3:.1f} us")
+    save_results(args.output, "logging", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
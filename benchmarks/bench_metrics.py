@@ -0,0 +1,68 @@
+"""
+Per-call overhead of the TMCL metrics instrumentation: ActualPosition polls on
+a zero-latency virtual TMCM-3212, plain against instrumented, plus the cost of
+a span on a disabled and an enabled registry.
+
+    python benchmarks/bench_metrics.py --calls 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Motors import metrics
+from Motors.trinamic_controller import TMCM3212
+from Motors.virtual_tmcm3212 import virtual_instrument
+from benchmarks.common import save_results
+
+
+def per_call(func, calls, repeat):
+    """Median over `repeat` runs of the time per call of `func`, in µs."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        runs.append((time.perf_counter() - start) / calls * 1e6)
+    return sorted(runs)[len(runs) // 2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="bench_metrics.json")
+    args = parser.parse_args(argv)
+
+    connection = virtual_instrument()
+    module = TMCM3212(connection)
+    ap = module._MotorTypeA.AP
+
+    def poll():
+        module.get_axis_parameter(ap.ActualPosition, 0)
+
+    results = {"plain_us": per_call(poll, args.calls, args.repeat)}
+    registry = metrics.Metrics()
+    metrics.instrument(connection, registry)
+    results["instrumented_us"] = per_call(poll, args.calls, args.repeat)
+    results["overhead_us"] = results["instrumented_us"] - results["plain_us"]
+
+    def span():
+        with registry.span("bench"):
+            pass
+
+    registry.enabled = False
+    results["span_disabled_us"] = per_call(span, args.calls, args.repeat)
+    registry.enabled = True
+    results["span_enabled_us"] = per_call(span, args.calls, args.repeat)
+
+    print(f"poll: {results['plain_us']:.2f} µs plain, {results['instrumented_us']:.2f} µs instrumented "
+          f"({results['overhead_us']:+.2f} µs)")
+    print(f"span: {results['span_disabled_us']:.2f} µs disabled, {results['span_enabled_us']:.2f} µs enabled")
+    save_results(args.output, "metrics", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Throughput of the pipelined TwoAxisScan against the naive serial loop on the
+virtual TMCM-3212.
+
+    python benchmarks/bench_scan_engine.py --exposure 0.02 --readout 0.03
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Motors.Delay_line import DelayLine
+from Motors.Polarization import PolarizationPaddler
+from Motors.scan_engine import TwoAxisScan
+from Motors.virtual_tmcm3212 import virtual_instrument
+from benchmarks.common import save_results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.002, help="injected per-command bus latency in s")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="virtual motion runs this much faster")
+    parser.add_argument("--delays", type=int, default=10, help="delay points per paddle angle")
+    parser.add_argument("--angles", type=int, default=3, help="paddle angles")
+    parser.add_argument("--step", type=float, default=0.05, help="delay step in mm")
+    parser.add_argument("--exposure", type=float, default=0.02, help="motion-sensitive part of the acquisition in s")
+    parser.add_argument("--readout", type=float, default=0.03, help="motion-insensitive readout in s")
+    parser.add_argument("--output", default="bench_scan_engine.json")
+    args = parser.parse_args(argv)
+
+    def acquire(point):
+        time.sleep(args.exposure)
+        return lambda: time.sleep(args.readout) or point.index
+
+    points = [(i * args.step, j * 10.0) for j in range(args.angles) for i in range(args.delays)]
+    results = {}
+    for mode in ("serial", "pipelined"):
+        connection = virtual_instrument(time_scale=args.time_scale, latency=args.latency)
+        scan = TwoAxisScan(DelayLine(connection), PolarizationPaddler(connection), acquire)
+        frames = connection.frames
+        start = time.perf_counter()
+        records = scan.run_serial(points) if mode == "serial" else scan.run(points)
+        elapsed = time.perf_counter() - start
+        results[mode] = {"points": len(records), "seconds": elapsed, "points_per_s": len(records) / elapsed,
+                         "frames": connection.frames - frames}
+        print(f"{mode:>9}: {len(records)} points in {elapsed:.2f} s, {len(records) / elapsed:.1f} pts/s, "
+              f"{connection.frames - frames} frames")
+
+    results["speedup"] = results["serial"]["seconds"] / results["pipelined"]["seconds"]
+    print(f"speed-up {results['speedup']:.2f}x")
+    save_results(args.output, "scan_engine", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import json
+import math
+import os
+import subprocess
+import time
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of `samples` for `fraction` in [0, 1]."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(samples):
+    """p50/p99/mean of a list of durations in s, reported in ms."""
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 0.50) * 1e3,
+        "p99_ms": percentile(samples, 0.99) * 1e3,
+        "mean_ms": sum(samples) / len(samples) * 1e3,
+    }
+
+
+def timed(func, *args, **kwargs):
+    """Call `func` and return (elapsed s, result)."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(path, name, config, results):
+    """Write one benchmark run as JSON, tagged with the current commit for later comparison."""
+    document = {
+        "benchmark": name,
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": config,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+    return document
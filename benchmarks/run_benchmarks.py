@@ -0,0 +1,107 @@
+"""
+Latency, homing and scan throughput of TMCM3212, DelayLine and PolarizationPaddler
+against the virtual TMCM-3212 with injected bus latency.
+
+    python -m benchmarks.run_benchmarks --latency 0 0.001 0.005 --output bench.json
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Motors.Delay_line import DelayLine
+from Motors.Polarization import PolarizationPaddler
+from Motors.virtual_tmcm3212 import virtual_instrument
+from benchmarks.common import save_results, summarize, timed
+
+
+def command_latency(delay, repeat):
+    ap = delay.motor.AP
+    samples = {"GAP": [], "SAP": [], "MVP": [], "read_many(6)": []}
+    for _ in range(repeat):
+        samples["GAP"].append(timed(delay.module.get_axis_parameter, ap.ActualPosition, 0)[0])
+        samples["SAP"].append(timed(delay.module.set_axis_parameter, ap.MaxVelocity, 0, 30000)[0])
+        samples["MVP"].append(timed(delay.connection.move_to, 0, 0, delay.module_id)[0])
+        samples["read_many(6)"].append(timed(delay.module.snapshot, [0])[0])
+    return {command: summarize(values) for command, values in samples.items()}
+
+
+def scan_1d(delay, positions):
+    start = time.perf_counter()
+    for position in positions:
+        delay.move_to(0, position)
+        delay.wait_until_reached(timeout=30)
+    elapsed = time.perf_counter() - start
+    return {"points": len(positions), "seconds": elapsed, "points_per_s": len(positions) / elapsed}
+
+
+def scan_2d(delay, paddler, positions, angles):
+    start = time.perf_counter()
+    for angle in angles:
+        paddler.move_to(1, angle)
+        paddler.wait_until_reached(timeout=30)
+        for position in positions:
+            delay.move_to(0, position)
+            delay.wait_until_reached(timeout=30)
+    elapsed = time.perf_counter() - start
+    points = len(positions) * len(angles)
+    return {"points": points, "seconds": elapsed, "points_per_s": points / elapsed}
+
+
+def run(latency, args):
+    connection = virtual_instrument(time_scale=args.time_scale, latency=latency, jitter=args.jitter, seed=0)
+    bring_up, delay = timed(DelayLine, connection)
+    paddler_bring_up, paddler = timed(PolarizationPaddler, connection)
+    homing, _ = timed(delay.go_to_home_position)
+
+    delay.move_to(0, 0)
+    delay.wait_until_reached(timeout=30)
+    settle = []
+    for position in (1.0, 0.0) * 3:
+        settle.append(timed(lambda: (delay.move_to(0, position), delay.wait_until_reached(timeout=30)))[0])
+
+    step = args.scan_range / max(args.points - 1, 1)
+    positions = [i * step for i in range(args.points)]
+    angles = [i * 10.0 for i in range(args.angles)]
+    return {
+        "latency_s": latency,
+        "command_latency": command_latency(delay, args.repeat),
+        "bring_up_s": {"delay_line": bring_up, "polarization_paddler": paddler_bring_up},
+        "homing_s": homing,
+        "move_settle": summarize(settle),
+        "scan_1d": scan_1d(delay, positions),
+        "scan_2d": scan_2d(delay, paddler, positions[:max(2, args.points // 4)], angles),
+        "frames": connection.frames,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.0, 0.001, 0.005],
+                        help="injected per-command bus latency in s")
+    parser.add_argument("--jitter", type=float, default=0.0, help="additional random latency in s")
+    parser.add_argument("--time-scale", type=float, default=10.0, help="virtual motion runs this much faster")
+    parser.add_argument("--repeat", type=int, default=200, help="samples per command latency")
+    parser.add_argument("--points", type=int, default=20, help="points of the 1-D scan")
+    parser.add_argument("--angles", type=int, default=3, help="paddle angles of the 2-D scan")
+    parser.add_argument("--scan-range", type=float, default=2.0, help="delay scan range in mm")
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args(argv)
+
+    results = []
+    for latency in args.latency:
+        result = run(latency, args)
+        results.append(result)
+        print(f"latency {latency * 1e3:.1f} ms: GAP p50 {result['command_latency']['GAP']['p50_ms']:.2f} ms, "
+              f"p99 {result['command_latency']['GAP']['p99_ms']:.2f} ms, "
+              f"bring-up {result['bring_up_s']['delay_line'] * 1e3:.1f} ms, homing {result['homing_s']:.2f} s, "
+              f"1-D {result['scan_1d']['points_per_s']:.1f} pts/s, 2-D {result['scan_2d']['points_per_s']:.1f} pts/s")
+
+    save_results(args.output, "motors", vars(args), results)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import serial
+
+from Motors.baud_rate import negotiate_baud_rate
+from Motors.virtual_tmcm3212 import GP0, VirtualSerialLine
+
+
+def _negotiate(line, **kwargs):
+    port = serial.Serial(line.port, 9600, timeout=0.2)
+    try:
+        return negotiate_baud_rate(port, rates=[9600, 19200, 57600, 115200, 230400], reads=8, **kwargs), port.baudrate
+    finally:
+        port.close()
+
+
+def _module_rate(line):
+    return VirtualSerialLine.RATES[line.module.global_params[(0, GP0.SerialBaudRate)]]
+
+
+def test_negotiates_up_to_the_fastest_rate():
+    with VirtualSerialLine(baud_rate=19200) as line:
+        report, host_rate = _negotiate(line)
+    assert report["rate"] == 230400
+    assert host_rate == 230400
+    assert _module_rate(line) == 230400
+    assert report["stored"]
+    assert set(report["round_trip_ms"]) == {19200, 57600, 115200, 230400}
+
+
+def test_falls_back_when_replies_are_corrupted():
+    with VirtualSerialLine(baud_rate=19200, max_reliable_rate=57600, error_every=3) as line:
+        report, host_rate = _negotiate(line, store=False)
+    assert report["rate"] == 57600
+    assert report["round_trip_ms"][115200] is None
+    assert 230400 not in report["round_trip_ms"]
+    assert host_rate == 57600
+    assert _module_rate(line) == 57600
+
+
+def test_falls_back_when_the_switch_reply_is_corrupted():
+    line = VirtualSerialLine(baud_rate=19200)
+    answer = line._answer
+
+    def corrupt_switch(frame):
+        data = answer(frame)
+        # SGP SerialBaudRate to 115200
+        if frame[1] == 9 and frame[2] == GP0.SerialBaudRate and frame[7] == 7:
+            data = data[:7] + bytes([data[7] ^ 0x10]) + data[8:]
+        return data
+
+    line._answer = corrupt_switch
+    with line:
+        report, host_rate = _negotiate(line, store=False)
+    assert report["rate"] == 57600
+    assert report["round_trip_ms"][115200] is None
+    assert host_rate == 57600
+    assert _module_rate(line) == 57600
@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+from pytrinamic.tmcl import TMCLCommand, TMCLReplyStatusError
+
+from Motors.broker import BrokerConnection, TmclBroker
+from Motors.trinamic_controller import TMCM3212
+from Motors.virtual_tmcm3212 import virtual_instrument
+
+AP = TMCM3212._MotorTypeA.AP
+
+
+@pytest.fixture
+def broker(tmp_path):
+    connection = virtual_instrument(latency=0.0005)
+    broker = TmclBroker(connection, str(tmp_path / "tmcm3212.sock")).start()
+    yield broker
+    broker.close()
+
+
+def test_clients_share_the_bus_without_mixing_replies(broker):
+    broker.connection.module.axes[1].params[AP.MaxVelocity] = 22222
+    errors = []
+
+    def client(axis, expected):
+        connection = BrokerConnection(broker.path)
+        try:
+            module = TMCM3212(connection)
+            for _ in range(50):
+                assert module.read_many(axis, [AP.MaxVelocity])[AP.MaxVelocity] == expected
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=client, args=args) for args in [(0, 51200), (1, 22222)] * 3]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert broker.stats()["requests"] == 300
+
+
+def test_switching_replies_off_is_refused(broker):
+    connection = BrokerConnection(broker.path)
+    module = TMCM3212(connection)
+    with pytest.raises(TMCLReplyStatusError):
+        connection.send(TMCLCommand.SGP, module.GP0.SuppressReply, 0, 1)
+    with pytest.raises(RuntimeError, match="direct connection"):
+        with module.bulk_write() as bulk:
+            bulk.set_axis_parameter(AP.MaxVelocity, 0, 40000)
+    assert broker.connection.module.global_params[(0, module.GP0.SuppressReply)] == 0
+    # Other clients keep getting replies
+    other = BrokerConnection(broker.path)
+    assert TMCM3212(other).read_many(0, [AP.MaxVelocity])[AP.MaxVelocity] == 51200
+    other.close()
+    connection.close()
@@ -0,0 +1,68 @@
+import pytest
+
+from Motors.bulk_write import BulkWriteError
+from Motors.trinamic_controller import TMCM3212
+from Motors.virtual_tmcm3212 import virtual_instrument
+
+AP = TMCM3212._MotorTypeA.AP
+
+
+def _setup():
+    connection = virtual_instrument()
+    return connection, connection.module, TMCM3212(connection)
+
+
+def test_writes_are_streamed_without_replies_and_replies_come_back_on():
+    connection, virtual, module = _setup()
+    with module.bulk_write() as bulk:
+        bulk.write_many(0, {AP.MaxVelocity: 40000, AP.MaxAcceleration: 30000})
+        bulk.set_axis_parameter(AP.RunCurrent, 1, 12)
+    assert bulk.report["writes"] == 3
+    assert bulk.report["mismatches"] == {}
+    assert virtual.global_params[(0, module.GP0.SuppressReply)] == 0
+    assert virtual.axes[0].params[AP.MaxAcceleration] == 30000
+    assert virtual.axes[1].params[AP.RunCurrent] == 12
+    assert module.read_many(0, [AP.MaxVelocity])[AP.MaxVelocity] == 40000
+
+
+def test_replies_come_back_on_when_streaming_fails():
+    connection, virtual, module = _setup()
+    send = connection._send
+    frames = []
+
+    def failing_send(host_id, module_id, data):
+        frames.append(data)
+        # GGP TelegramPauseTime, SGP SuppressReply 1, then the first SAP fails
+        if len(frames) == 3:
+            raise RuntimeError("bus error")
+        send(host_id, module_id, data)
+
+    connection._send = failing_send
+    with pytest.raises(RuntimeError, match="bus error"):
+        with module.bulk_write() as bulk:
+            bulk.write_many(0, {AP.MaxVelocity: 40000})
+    connection._send = send
+    assert virtual.global_params[(0, module.GP0.SuppressReply)] == 0
+    assert module.read_many(0, [AP.MaxVelocity])[AP.MaxVelocity] == 51200
+
+
+def test_mismatch_is_reported_and_dropped_from_the_cache():
+    connection, virtual, module = _setup()
+    module.enable_cache()
+    set_axis_parameter = virtual._set_axis_parameter
+
+    def ignore_max_velocity(axis, index, value):
+        if index != AP.MaxVelocity:
+            set_axis_parameter(axis, index, value)
+
+    virtual._set_axis_parameter = ignore_max_velocity
+    with pytest.raises(BulkWriteError) as error:
+        with module.bulk_write() as bulk:
+            bulk.write_many(0, {AP.MaxVelocity: 40000, AP.MaxAcceleration: 30000})
+    assert error.value.report["mismatches"] == {(0, AP.MaxVelocity): (40000, 51200)}
+    virtual._set_axis_parameter = set_axis_parameter
+    # The retry is sent instead of being skipped as already cached
+    with module.bulk_write() as bulk:
+        bulk.write_many(0, {AP.MaxVelocity: 40000, AP.MaxAcceleration: 30000})
+    assert bulk.report["writes"] == 1
+    assert virtual.axes[0].params[AP.MaxVelocity] == 40000
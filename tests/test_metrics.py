@@ -0,0 +1,41 @@
+import time
+
+from Motors.metrics import Metrics, instrument
+from Motors.trinamic_controller import TMCM3212
+from Motors.virtual_tmcm3212 import virtual_instrument
+
+
+def test_frames_sent_with_replies_suppressed_are_not_matched_to_later_replies():
+    connection = virtual_instrument()
+    module = TMCM3212(connection)
+    ap = module._MotorTypeA.AP
+    metrics = instrument(connection, Metrics())
+
+    with module.bulk_write(verify=False) as bulk:
+        bulk.write_many(0, {ap.MaxVelocity: 40000, ap.MaxAcceleration: 30000, ap.RunCurrent: 12})
+    time.sleep(0.2)
+    module.write_many(0, {ap.MaxVelocity: 50000})
+
+    stats = metrics.snapshot()["commands"]
+    max_velocity = stats[f"SAP {ap.MaxVelocity}"]
+    assert max_velocity["requests"] == 2
+    assert max_velocity["replies"] == 1
+    # Charged to the acknowledged write, not to the bulk write 0.2 s earlier
+    assert max_velocity["latency"]["sum_s"] < 0.1
+    assert stats[f"SAP {ap.MaxAcceleration}"]["replies"] == 0
+    suppress_reply = stats[f"SGP {module.GP0.SuppressReply}"]
+    assert (suppress_reply["requests"], suppress_reply["replies"]) == (2, 1)
+
+
+def test_reset_during_a_request_does_not_fail_it():
+    connection = virtual_instrument()
+    module = TMCM3212(connection)
+    metrics = instrument(connection, Metrics())
+    recv = connection._recv
+
+    def reset_then_recv(host_id, module_id):
+        metrics.reset()
+        return recv(host_id, module_id)
+
+    connection._recv = reset_then_recv
+    assert module.read_many(0, [module._MotorTypeA.AP.MaxVelocity])
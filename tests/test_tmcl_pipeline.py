@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+from pytrinamic.tmcl import TMCLCommand, TMCLReplyStatusError
+
+from Motors.tmcl_pipeline import PipelineError, PipelinedTransport, ap_frame
+from Motors.trinamic_controller import TMCM3212
+from Motors.virtual_tmcm3212 import virtual_instrument
+
+AP = TMCM3212._MotorTypeA.AP
+
+
+def test_replies_come_back_in_request_order_over_several_windows():
+    connection = virtual_instrument(latency=0.001, jitter=0.001, seed=3)
+    transport = PipelinedTransport(connection, window=4)
+    requests = [(1, TMCLCommand.SAP) + ap_frame(AP.MaxVelocity, axis % 3) + (1000 + i,) for i, axis in
+                enumerate(range(9))]
+    transport.request_many(requests)
+    values = transport.get_axis_parameters(1, [(axis, AP.MaxVelocity) for axis in range(3)])
+    assert values == {(0, AP.MaxVelocity): 1006, (1, AP.MaxVelocity): 1007, (2, AP.MaxVelocity): 1008}
+
+
+def test_lost_reply_raises_pipeline_error():
+    connection = virtual_instrument()
+    transport = PipelinedTransport(connection)
+    with pytest.raises(PipelineError, match="Lost reply"):
+        # No module answers at address 7
+        transport.request_many([(1, TMCLCommand.GGP, 0, 0, 0), (7, TMCLCommand.GGP, 0, 0, 0)])
+
+
+def test_status_error_is_raised_after_the_window_is_drained():
+    connection = virtual_instrument()
+    transport = PipelinedTransport(connection)
+    with pytest.raises(TMCLReplyStatusError):
+        transport.request_many([(1, TMCLCommand.GAP, 255, 9, 0), (1, TMCLCommand.GGP, 0, 0, 0)])
+    # The stream is still in sync for the next batch
+    assert transport.request_many([(1, TMCLCommand.GAP) + ap_frame(AP.MaxVelocity, 0) + (0,)])[0].value == 51200
+
+
+def test_direct_calls_and_pipelined_batches_share_the_connection_lock():
+    connection = virtual_instrument(latency=0.0005, jitter=0.0005, seed=1)
+    module = TMCM3212(connection)
+    motor = module.motors[0]
+    motor.set_axis_parameter(AP.MaxAcceleration, 12345)
+    errors = []
+    stop = threading.Event()
+
+    def sample():
+        try:
+            while not stop.is_set():
+                values = module.read_axes({axis: [AP.MaxVelocity, AP.MaxAcceleration] for axis in range(3)})
+                assert values[(0, AP.MaxAcceleration)] == 12345
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=sample)
+    thread.start()
+    try:
+        # pytrinamic's own request path, outside PipelinedTransport
+        readings = [motor.get_axis_parameter(AP.MaxAcceleration) for _ in range(200)]
+    finally:
+        stop.set()
+        thread.join()
+    assert errors == []
+    assert set(readings) == {12345}
+
+
+def test_parameter_cache_skips_unchanged_writes():
+    connection = virtual_instrument()
+    module = TMCM3212(connection)
+    module.enable_cache()
+    module.write_many(0, {AP.MaxVelocity: 40000, AP.MaxAcceleration: 30000})
+    frames = connection.frames
+    assert module.write_many(0, {AP.MaxVelocity: 40000, AP.MaxAcceleration: 30000}) == {}
+    assert module.read_many(0, [AP.MaxVelocity])[AP.MaxVelocity] == 40000
+    assert connection.frames == frames